@@ -0,0 +1,284 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, request, abort, jsonify, url_for
+from sqlalchemy import func, case
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+from models import db, Venue, Artist, Show, TableVersion
+from genres import names_of
+from pagination import keyset_page, page_size, page_cursors, ARTIST_KEY, SHOW_KEY
+import facets
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# /api/v1 serves the venues, artists and shows behind the HTML pages as JSON:
+#  * ?fields=a,b picks the fields of each item (a sparse fieldset); only their
+#    columns are selected, and a venue's or artist's shows are only loaded
+#    when past_shows or upcoming_shows is asked for.
+#  * Every response has a strong ETag hashed from a validator that runs
+#    before anything else, and a matching If-None-Match gets a 304 without
+#    building the body. A collection's validator is the TableVersion counters
+#    of the tables it reads, which triggers bump on every write that changes
+#    rows (a few primary key rows, however big the table); a single venue's or
+#    artist's is one aggregate over the updated_at of its row, its shows and
+#    their counterparts.
+#  * A single venue or artist also has a Last-Modified for If-Modified-Since:
+#    its newest updated_at, or the start of its latest show if that is later,
+#    since a show starting moves it to past_shows without writing a row.
+#    Collections have none: a deleted row leaves no newer updated_at behind,
+#    so only the ETag notices it.
+# Listings take the same ?genre=&city=&state= filters and keyset cursors as
+# the HTML pages.
+
+VERSION = 'v1'
+
+api = Blueprint('api', __name__, url_prefix='/api/' + VERSION)
+
+
+def _fields(model, names):
+    return {name: model.genre_mask if name == 'genres' else getattr(model, name) for name in names}
+
+
+VENUE_FIELDS = _fields(Venue, ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+                               'facebook_link', 'seeking_talent', 'seeking_description', 'image_link',
+                               'past_shows_count', 'upcoming_shows_count', 'num_upcoming_shows', 'updated_at'))
+ARTIST_FIELDS = _fields(Artist, ('id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+                                 'facebook_link', 'seeking_venue', 'seeking_description', 'image_link',
+                                 'past_shows_count', 'upcoming_shows_count', 'updated_at'))
+SHOW_FIELDS = {'id': Show.id,
+               'start_time': Show.start_time,
+               'venue_id': Show.venue_id,
+               'venue_name': Venue.name,
+               'artist_id': Show.artist_id,
+               'artist_name': Artist.name,
+               'artist_image_link': Artist.image_link,
+               'updated_at': Show.updated_at}
+# a venue's or artist's shows, on its own resource only
+SHOW_LISTS = ('past_shows', 'upcoming_shows')
+
+# what the HTML listings show, when there is no ?fields=
+VENUE_LIST_FIELDS = ('id', 'name', 'city', 'state', 'num_upcoming_shows')
+ARTIST_LIST_FIELDS = ('id', 'name')
+SHOW_LIST_FIELDS = ('id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link')
+
+
+# the app's own 404 and 500 handlers render HTML and would win over a
+# blueprint's HTTPException handler, so those codes are registered as well
+@api.errorhandler(HTTPException)
+@api.errorhandler(404)
+@api.errorhandler(500)
+def error(e):
+    return jsonify(status=e.code, error=e.name, description=e.description), e.code
+
+
+def fieldset(available, default):
+    """The ?fields= names in request order, else `default`; 400 on unknown names."""
+    value = request.args.get('fields')
+    if value is None:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    if not names or any(name not in available for name in names):
+        abort(400, 'fields is a comma-separated list of: ' + ', '.join(available))
+    return names
+
+
+def respond(version, build, last_modified=None):
+    """The JSON of build(), or a 304 when the client already has `version`."""
+    etag = hashlib.sha256(json.dumps([VERSION, request.full_path, list(version)], default=str)
+                          .encode()).hexdigest()[:40]
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(json.dumps(build()), mimetype='application/json')
+    else:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # cacheable, but only after asking whether it changed
+    response.cache_control.no_cache = True
+    return response
+
+#  Validators
+#  ----------------------------------------------------------------
+
+def table_version(*models):
+    names = [model.__tablename__ for model in models]
+    versions = dict(db.session.query(TableVersion.name, func.sum(TableVersion.version))
+                    .filter(TableVersion.name.in_(names))
+                    .group_by(TableVersion.name))
+    return [versions.get(name) for name in names]
+
+
+def entity_version(model, entity_id, show_fk, counterpart, counterpart_fk, now):
+    # the entity, its shows and their counterparts; the upcoming count makes
+    # shows that started since the last response change it, and the newest
+    # such start is when the past/upcoming split last changed
+    return db.session.query(model.updated_at,
+                            func.count(Show.id),
+                            func.count(case((Show.start_time > now, Show.id))),
+                            func.max(Show.updated_at),
+                            func.max(counterpart.updated_at),
+                            func.max(case((Show.start_time <= now, Show.start_time)))) \
+        .select_from(model) \
+        .outerjoin(Show, show_fk == model.id) \
+        .outerjoin(counterpart, counterpart.id == counterpart_fk) \
+        .filter(model.id == entity_id) \
+        .group_by(model.id, model.updated_at) \
+        .first()
+
+def modified_at(version):
+    """When an entity_version() last changed, as a naive UTC datetime.
+
+    The newest updated_at, unless a show has started since: that moved it from
+    upcoming to past without writing anything, and an If-Modified-Since from
+    before then must not get a 304. Show times are local, updated_at is UTC.
+    """
+    updated_at, shows, upcoming, shows_updated_at, counterparts_updated_at, started = version
+    times = [at for at in (updated_at, shows_updated_at, counterparts_updated_at) if at is not None]
+    if started is not None:
+        times.append(started.astimezone(timezone.utc).replace(tzinfo=None))
+    return max(times)
+
+#  Bodies
+#  ----------------------------------------------------------------
+
+def _query(fields, names, keys=()):
+    # the requested columns plus those the caller orders or pages by
+    selected = [name for name in dict.fromkeys(list(names) + list(keys)) if name in fields]
+    return db.session.query(*[fields[name].label(name) for name in selected])
+
+
+def _item(row, names):
+    item = {}
+    for name in names:
+        value = getattr(row, name)
+        if name == 'genres':
+            value = names_of(value or 0)
+        elif name == 'updated_at':
+            value = value.isoformat() + 'Z'
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        item[name] = value
+    return item
+
+
+def _page_link(name, cursor):
+    if cursor is None:
+        return None
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    args.pop('before', None)
+    args[name] = cursor
+    return url_for(request.endpoint, **args)
+
+
+def _page(page, names):
+    return {'data': [_item(row, names) for row in page],
+            'links': {'next': _page_link('after', page.next_cursor),
+                      'prev': _page_link('before', page.prev_cursor)}}
+
+
+def _shows(show_fk, entity_id, counterpart, counterpart_fk, now):
+    prefix = counterpart.__name__.lower()
+    rows = db.session.query(Show.start_time,
+                            counterpart.id.label(prefix + '_id'),
+                            counterpart.name.label(prefix + '_name'),
+                            counterpart.image_link.label(prefix + '_image_link')) \
+        .join(counterpart, counterpart.id == counterpart_fk) \
+        .filter(show_fk == entity_id) \
+        .order_by(Show.start_time, Show.id)
+    shows = {'past_shows': [], 'upcoming_shows': []}
+    for row in rows:
+        show = _item(row, (prefix + '_id', prefix + '_name', prefix + '_image_link', 'start_time'))
+        shows['upcoming_shows' if row.start_time > now else 'past_shows'].append(show)
+    return shows
+
+
+def _detail(model, fields, entity_id, show_fk, counterpart, counterpart_fk):
+    names = fieldset(list(fields) + list(SHOW_LISTS), list(fields) + list(SHOW_LISTS))
+    now = datetime.now()
+    version = entity_version(model, entity_id, show_fk, counterpart, counterpart_fk, now)
+    if version is None:
+        abort(404)
+
+    def build():
+        row = _query(fields, names, keys=('id',)).filter(model.id == entity_id).first()
+        if row is None:
+            abort(404)
+        columns = [name for name in names if name in fields]
+        item = _item(row, columns)
+        if len(columns) < len(names):
+            item.update(_shows(show_fk, entity_id, counterpart, counterpart_fk, now))
+        return {'data': {name: item[name] for name in names}}
+
+    return respond(version, build, modified_at(version))
+
+#  Resources
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+def venues():
+    # the /venues directory: every venue, in area order
+    names = fieldset(VENUE_FIELDS, VENUE_LIST_FIELDS)
+    chosen = facets.selected(request.args)
+
+    def build():
+        rows = _query(VENUE_FIELDS, names) \
+            .filter(*facets.criteria(Venue, chosen)) \
+            .order_by(Venue.city, Venue.state, Venue.name, Venue.id)
+        return {'data': [_item(row, names) for row in rows]}
+
+    return respond(table_version(Venue), build)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return _detail(Venue, VENUE_FIELDS, venue_id, Show.venue_id, Artist, Show.artist_id)
+
+
+@api.route('/artists')
+def artists():
+    names = fieldset(ARTIST_FIELDS, ARTIST_LIST_FIELDS)
+    chosen = facets.selected(request.args)
+    after, before = page_cursors(ARTIST_KEY)
+    per_page = page_size(current_app.config['ARTISTS_PER_PAGE'])
+
+    def build():
+        page = keyset_page(_query(ARTIST_FIELDS, names, keys=('name', 'id')).filter(*facets.criteria(Artist, chosen)),
+                           (Artist.name, Artist.id),
+                           key=lambda row: (row.name, row.id),
+                           per_page=per_page,
+                           after=after,
+                           before=before)
+        return _page(page, names)
+
+    return respond(table_version(Artist), build)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return _detail(Artist, ARTIST_FIELDS, artist_id, Show.artist_id, Venue, Show.venue_id)
+
+
+@api.route('/shows')
+def shows():
+    names = fieldset(SHOW_FIELDS, SHOW_LIST_FIELDS)
+    after, before = page_cursors(SHOW_KEY)
+    per_page = page_size(current_app.config['SHOWS_PER_PAGE'])
+
+    def build():
+        query = _query(SHOW_FIELDS, names, keys=('start_time', 'id')) \
+            .select_from(Show) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .join(Artist, Show.artist_id == Artist.id)
+        page = keyset_page(query,
+                           (Show.start_time, Show.id),
+                           key=lambda row: (row.start_time, row.id),
+                           per_page=per_page,
+                           after=after,
+                           before=before)
+        return _page(page, names)
+
+    return respond(table_version(Show, Venue, Artist), build)
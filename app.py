@@ -2,12 +2,18 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import io
 import json
+import sys
+import hmac
+import click
+import config
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context
 from flask_moment import Moment
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import groupby
 from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
@@ -15,6 +21,21 @@ from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
 from models import *
+from pagination import keyset_page, encode_cursor, page_size, page_cursors, ARTIST_KEY, SHOW_KEY
+import search
+import counters
+import facets
+import autocomplete
+import importer
+import exporter
+import cache
+from formatting import DatetimeFormatter
+from instrumentation import SQLInstrumentation
+from metrics import Metrics
+from logs import setup_logging
+from assets import Assets
+from images import Images
+from api import api
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -23,35 +44,226 @@ from models import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+app.config.from_object(config.PROFILES[app.config['PROFILE']])
+db.init_app(app)
 migrate = Migrate(app, db)
+page_cache = cache.create(app.config)
+sql_instrumentation = SQLInstrumentation(app)
+metrics = Metrics(app)
+assets = Assets(app)
+images = Images(app)
+app.register_blueprint(api)
 
 
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+@app.before_first_request
+def start_show_roll_forward():
+    interval = app.config['SHOW_ROLL_FORWARD_INTERVAL']
+    if interval > 0:
+        counters.start_roll_forward(app, interval)
+
+@app.cli.group('show-counters')
+def shows_counters():
+    """Maintain the show counters on Venue and Artist."""
+
+@shows_counters.command('recount')
+def recount_shows_command():
+    """Recompute every counter from the Show table."""
+    print('Recounted {} rows'.format(counters.recount_all()))
+
+@shows_counters.command('roll-forward')
+@click.option('--window', type=int, help='Minutes to look back, instead of to the last run.')
+def roll_forward_shows_command(window):
+    """Move shows that started since the last run from upcoming to past."""
+    window = timedelta(minutes=window) if window is not None else None
+    print('Rolled forward {} rows'.format(counters.roll_forward(window)))
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+@app.cli.group('facets')
+def facets_command():
+    """Maintain the genre/city/state facet counts."""
+
+@facets_command.command('rebuild')
+def rebuild_facets_command():
+    """Recompute every facet count from the Venue and Artist tables."""
+    print('Rebuilt {} facet rows'.format(facets.rebuild()))
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+@app.before_first_request
+def start_autocomplete_rebuilder():
+    interval = app.config['AUTOCOMPLETE_REBUILD_INTERVAL']
+    if interval > 0:
+        autocomplete.start_rebuilder(app, interval)
+
+def autocomplete_stat(name):
+    stats = autocomplete.stats()
+    return {kind: stats[kind][name] for kind in autocomplete.KINDS.values()} if stats['ready'] else {}
+
+metrics.gauge('autocomplete_entries', 'Names in the autocomplete index.',
+              lambda: autocomplete_stat('entries'), label='kind')
+metrics.gauge('autocomplete_memory_bytes', 'Approximate memory held by the autocomplete index.',
+              lambda: autocomplete_stat('memory_bytes'), label='kind')
+metrics.gauge('autocomplete_build_seconds', 'Duration of the last autocomplete index build.',
+              lambda: autocomplete.stats().get('build_seconds'))
+
+@app.cli.group('autocomplete')
+def autocomplete_command():
+    """Inspect the autocomplete index."""
+
+@autocomplete_command.command('stats')
+def autocomplete_stats_command():
+    """Build the index and report its size."""
+    autocomplete.rebuild()
+    stats = autocomplete.stats()
+    for kind in autocomplete.KINDS.values():
+        print('{}: {entries} names, {keys} keys, {memory_bytes} bytes'.format(kind, **stats[kind]))
+    print('built in {:.3f}s'.format(stats['build_seconds']))
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(importer.KINDS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'format_', type=click.Choice(importer.FORMATS),
+              help='Input format; by default taken from the file extension.')
+@click.option('--batch-size', default=lambda: app.config['IMPORT_BATCH_SIZE'], type=int,
+              help='Rows per insert and commit.')
+def import_command(kind, source, format_, batch_size):
+    """Import venues, artists or shows from a CSV or JSON lines file (- for stdin)."""
+    format_ = format_ or ('jsonl' if source.name.endswith(('.jsonl', '.ndjson')) else 'csv')
+    report = importer.import_rows(kind, source, format_, batch_size=batch_size,
+                                  max_errors=app.config['IMPORT_MAX_ERRORS'])
+    rows_imported(kind)
+    for error in report.errors:
+        print('line {}: {}'.format(error['line'], json.dumps(error['errors'])), file=sys.stderr)
+    if report.failed > len(report.errors):
+        print('... {} more errors'.format(report.failed - len(report.errors)), file=sys.stderr)
+    print(report.summary())
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(exporter.KINDS))
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='File to write, - for stdout.')
+@click.option('--format', 'format_', type=click.Choice(exporter.FORMATS), default='csv', show_default=True)
+@click.option('--since', type=click.DateTime(), help='Shows starting at or after this time.')
+@click.option('--until', type=click.DateTime(), help='Shows starting before this time.')
+@click.option('--city')
+@click.option('--state')
+def export_command(kind, output, format_, since, until, city, state):
+    """Write venues, artists or shows as CSV or JSON lines."""
+    for chunk in exporter.stream(kind, format_, app.config['EXPORT_BATCH_SIZE'],
+                                 since=since, until=until, city=city, state=state):
+        output.write(chunk)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    # I took this if else statement from the accepted answer of:
-    #    https://stackoverflow.com/questions/63269150/typeerror-parser-must-be-a-string-or-character-stream-not-datetime
-    if isinstance(value, str):
-        date = dateutil.parser.parse(value)
-    else:
-        date = value
-    
-    if format == 'full':
-        format="EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format="EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+format_datetime = DatetimeFormatter(locale='en', cache_size=app.config['DATETIME_FORMAT_CACHE_SIZE'])
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Detail loaders.
+#----------------------------------------------------------------------------#
+
+def load_with_shows(model, entity_id, show_fk, counterpart, counterpart_fk):
+    """Load a venue or artist and all its shows in one joined statement.
+
+    `counterpart` is the model on the other side of each show (Artist for a
+    venue, Venue for an artist); its id, name and image come back prefixed with
+    its lower-cased name, e.g. artist_name. Shows are split into past and
+    upcoming against a single `now`.
+    """
+    prefix = counterpart.__name__.lower()
+    rows = db.session.query(model,
+                            Show.start_time,
+                            counterpart.id.label(prefix + '_id'),
+                            counterpart.name.label(prefix + '_name'),
+                            counterpart.image_link.label(prefix + '_image_link')) \
+        .outerjoin(Show, show_fk == model.id) \
+        .outerjoin(counterpart, counterpart.id == counterpart_fk) \
+        .filter(model.id == entity_id) \
+        .order_by(Show.start_time) \
+        .all()
+    if not rows:
+        abort(404)
+
+    now = datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        if row.start_time is None:
+            # the outer join yields one show-less row for an entity without shows
+            continue
+        show = {
+            prefix + '_id': row[2],
+            prefix + '_name': row[3],
+            prefix + '_image_link': row[4],
+            'start_time': row.start_time,
+        }
+        if row.start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+
+    return rows[0][0], past_shows, upcoming_shows
+
+#----------------------------------------------------------------------------#
+# Write hooks.
+#----------------------------------------------------------------------------#
+
+# Called by the write views after a successful commit, to drop whatever was built
+# from the written rows. Pages are cached under tags: 'venue-list'/'artist-list'
+# for every page listing venues/artists, 'show-list' for /shows, and
+# 'venue:<id>'/'artist:<id>' for detail pages.
+
+def show_counterparts(show_fk, entity_id, counterpart_fk):
+    # ids on the other side of an entity's shows, whose detail pages show its name
+    return [row[0] for row in db.session.query(counterpart_fk).filter(show_fk == entity_id).distinct()]
+
+def venue_written(venue_id=None, artist_ids=()):
+    search.invalidate(Venue)
+    tags = ['venue-list']
+    if venue_id is not None:
+        tags += ['venue:{}'.format(venue_id), 'show-list']
+        tags += ['artist:{}'.format(artist_id) for artist_id in artist_ids]
+    page_cache.invalidate(*tags)
+
+def artist_written(artist_id=None, venue_ids=()):
+    search.invalidate(Artist)
+    tags = ['artist-list']
+    if artist_id is not None:
+        tags += ['artist:{}'.format(artist_id), 'show-list']
+        tags += ['venue:{}'.format(venue_id) for venue_id in venue_ids]
+    page_cache.invalidate(*tags)
+
+def rows_imported(kind):
+    # a bulk import can touch any page
+    if kind in ('venues', 'artists'):
+        search.invalidate(Venue if kind == 'venues' else Artist)
+        autocomplete.request_rebuild()
+    page_cache.clear()
+
+def show_written(venue_id, artist_id):
+    page_cache.invalidate('show-list', 'venue-list', 'venue:{}'.format(venue_id), 'artist:{}'.format(artist_id))
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 @app.route('/')
+@page_cache.cached(tags=lambda: ['venue-list', 'artist-list'])
 def index():
     recent_venues = Venue.query.order_by(Venue.id.desc()).limit(10).all()
     recent_artists = Artist.query.order_by(Artist.id.desc()).limit(10).all()
@@ -59,52 +271,80 @@ def index():
     return render_template('pages/home.html', recent_venues=recent_venues, recent_artists=recent_artists)
 
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete')
+def autocomplete_names():
+    # ?q=<prefix>, optionally &kind=venue|artist and &limit=
+    kinds = request.args.getlist('kind') or list(autocomplete.KINDS.values())
+    if any(kind not in autocomplete.KINDS.values() for kind in kinds):
+        abort(400)
+    limit = max(1, min(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int),
+                       app.config['MAX_PER_PAGE']))
+    endpoints = {'venue': ('show_venue', 'venue_id'), 'artist': ('show_artist', 'artist_id')}
+    results = []
+    for kind, entry_id, name in autocomplete.complete(request.args.get('q', ''), limit, kinds):
+        endpoint, argument = endpoints[kind]
+        results.append({'kind': kind, 'id': entry_id, 'name': name,
+                        'url': url_for(endpoint, **{argument: entry_id})})
+    return jsonify(results=results)
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached(tags=lambda: ['venue-list'])
 def venues():
+    # one statement for the whole directory, ordered so that venues of the same area
+    # are adjacent; upcoming show counts are maintained on the row by counters.py
+    chosen = facets.selected(request.args)
+    venue_rows = db.session.query(Venue.city,
+                                  Venue.state,
+                                  Venue.id,
+                                  Venue.name,
+                                  Venue.num_upcoming_shows) \
+        .filter(*facets.criteria(Venue, chosen)) \
+        .order_by(Venue.city, Venue.state, Venue.name, Venue.id) \
+        .all()
+
     data = []
-    # populate all rows with distinct city and state combinations
-    unique_areas = db.session.query(Venue).distinct(Venue.city, Venue.state).all()
-    
-    for unique_area in unique_areas:
+    for (city, state), area_rows in groupby(venue_rows, key=lambda row: (row.city, row.state)):
         area = {}
-        venues = Venue.query.filter_by(city=unique_area.city, state=unique_area.state).all()
-        area['city'] = unique_area.city
-        area['state'] = unique_area.state
+        area['city'] = city
+        area['state'] = state
         area['venues'] = []
-        
-        for venue in venues:
+
+        for row in area_rows:
             venue_temp = {}
-            venue_temp['id'] = venue.id
-            venue_temp['name'] = venue.name
-            venue_temp['num_upcoming_shows'] = len(Show.query.join(Venue).filter(Show.venue_id==Venue.id).filter(Show.start_time>datetime.now()).all())
+            venue_temp['id'] = row.id
+            venue_temp['name'] = row.name
+            venue_temp['num_upcoming_shows'] = row.num_upcoming_shows
             area['venues'].append(venue_temp)
-            
+
         data.append(area)
-        
-    return render_template('pages/venues.html', areas=data)
+
+    return render_template('pages/venues.html', areas=data,
+                           facets=facets.counts(Venue), chosen=chosen)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    search_term = request.form['search_term']
-    search_query = '%{0}%'.format(search_term)
-    venues = Venue.query.filter(Venue.name.ilike(search_query)).all()
+    search_term = request.form.get('search_term', '')
+    chosen = facets.selected(request.form)
+    response = search.search(Venue, search_term,
+                             page=request.form.get('page', 1, type=int),
+                             per_page=app.config['SEARCH_PER_PAGE'],
+                             max_results=app.config['SEARCH_MAX_RESULTS'],
+                             filters=facets.criteria(Venue, chosen))
 
-    response = {
-        "count": len(venues),
-        "data": venues
-    }
-
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                           facets=facets.counts(Venue), chosen=chosen)
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached(tags=lambda venue_id: ['venue:{}'.format(venue_id)])
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-    upcoming_shows_query = Show.query.join(Artist).filter(Show.venue_id==venue.id).filter(Show.start_time>datetime.now()).all()
-    past_shows_query = Show.query.join(Artist).filter(Show.venue_id==venue.id).filter(Show.start_time<=datetime.now()).all()
+    venue, past_shows, upcoming_shows = load_with_shows(Venue, venue_id, Show.venue_id, Artist, Show.artist_id)
     data={
         "id": venue.id,
         "name": venue.name,
@@ -118,31 +358,12 @@ def show_venue(venue_id):
         "seeking_talent": venue.seeking_talent,
         "seeking_description": venue.seeking_description,
         "image_link": venue.image_link,
-        "past_shows": [],
-    "upcoming_shows": [],
-    "past_shows_count": len(past_shows_query),
-    "upcoming_shows_count": len(upcoming_shows_query)
-  }
-    
-    for past_shows in past_shows_query:
-        past_shows_temp = {}
-        past_shows_temp['artist_id'] = past_shows.artist_id
-        past_shows_temp['artist_name'] = past_shows.artist.name
-        past_shows_temp['start_time'] = past_shows.start_time
-        past_shows_temp['artist_image_link'] = past_shows.artist.image_link
-
-        data['past_shows'].append(past_shows_temp)
-
-    for upcoming_shows in upcoming_shows_query:
-        upcoming_shows_temp = {}
-        upcoming_shows_temp['artist_id'] = upcoming_shows.artist_id
-        upcoming_shows_temp['artist_name'] = upcoming_shows.artist.name
-        upcoming_shows_temp['start_time'] = upcoming_shows.start_time
-        upcoming_shows_temp['artist_image_link'] = upcoming_shows.artist.image_link
-        upcoming_shows_temp['artist_name'] = upcoming_shows.artist.name
-        
-        data['upcoming_shows'].append(upcoming_shows_temp)
-        
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+
     return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -177,6 +398,7 @@ def create_venue_submission():
         
         db.session.add(venue)
         db.session.commit()
+        venue_written()
     except:
         db.session.rollback()
         error = True
@@ -196,8 +418,10 @@ def delete_venue(venue_id):
     error = False
     try:
         venue = db.session.query(Venue).get(venue_id)
+        artist_ids = show_counterparts(Show.venue_id, venue.id, Show.artist_id)
         db.session.delete(venue)
         db.session.commit()
+        venue_written(venue_id, artist_ids)
     except:
         db.session.rollback()
         error = True
@@ -213,29 +437,53 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@page_cache.cached(tags=lambda: ['artist-list'])
 def artists():
-    
-    return render_template('pages/artists.html', artists=Artist.query.all())
+    after, before = page_cursors(ARTIST_KEY)
+    chosen = facets.selected(request.args)
+    conditions = facets.criteria(Artist, chosen)
+    page = keyset_page(db.session.query(Artist.id, Artist.name).filter(*conditions),
+                       (Artist.name, Artist.id),
+                       key=lambda row: (row.name, row.id),
+                       per_page=page_size(app.config['ARTISTS_PER_PAGE']),
+                       after=after,
+                       before=before)
+
+    # A-Z jump index: one grouped row per initial, with the first name under it.
+    # Starting a page after (first_name, 0) lands on that initial's first artist.
+    initial = db.func.upper(db.func.substr(Artist.name, 1, 1))
+    index_rows = db.session.query(initial.label('letter'),
+                                  db.func.count(Artist.id).label('count'),
+                                  db.func.min(Artist.name).label('first_name')) \
+        .filter(*conditions) \
+        .group_by(initial) \
+        .order_by(initial) \
+        .all()
+    letters = [{'letter': row.letter,
+                'count': row.count,
+                'cursor': encode_cursor((row.first_name, 0))} for row in index_rows]
+
+    return render_template('pages/artists.html', artists=page.items, page=page, letters=letters,
+                           facets=facets.counts(Artist), chosen=chosen)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    search_term = request.form['search_term']
-    search_query = '%{0}%'.format(search_term)
-    artists = Artist.query.filter(Artist.name.ilike(search_query)).all()
+    search_term = request.form.get('search_term', '')
+    chosen = facets.selected(request.form)
+    response = search.search(Artist, search_term,
+                             page=request.form.get('page', 1, type=int),
+                             per_page=app.config['SEARCH_PER_PAGE'],
+                             max_results=app.config['SEARCH_MAX_RESULTS'],
+                             filters=facets.criteria(Artist, chosen))
 
-    response = {
-        "count": len(artists),
-        "data": artists
-    }
-
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                           facets=facets.counts(Artist), chosen=chosen)
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached(tags=lambda artist_id: ['artist:{}'.format(artist_id)])
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-    artist = Artist.query.get(artist_id)
-    upcoming_shows_query = Show.query.join(Venue).filter(Show.artist_id==artist.id).filter(Show.start_time>datetime.now()).all()
-    past_shows_query = Show.query.join(Venue).filter(Show.artist_id==artist.id).filter(Show.start_time<=datetime.now()).all()
+    artist, past_shows, upcoming_shows = load_with_shows(Artist, artist_id, Show.artist_id, Venue, Show.venue_id)
     data={
         "id": artist.id,
         "name": artist.name,
@@ -248,30 +496,11 @@ def show_artist(artist_id):
         "seeking_venue": artist.seeking_venue,
         "seeking_description": artist.seeking_description,
         "image_link": artist.image_link,
-        "past_shows": [],
-    "upcoming_shows": [],
-    "past_shows_count": len(past_shows_query),
-    "upcoming_shows_count": len(upcoming_shows_query)
-  }
-    
-    for past_shows in past_shows_query:
-        past_shows_temp = {}
-        past_shows_temp['venue_id'] = past_shows.venue_id
-        past_shows_temp['venue_name'] = past_shows.venue.name
-        past_shows_temp['start_time'] = past_shows.start_time
-        past_shows_temp['venue_image_link'] = past_shows.venue.image_link
-
-        data['past_shows'].append(past_shows_temp)
-
-    for upcoming_shows in upcoming_shows_query:
-        upcoming_shows_temp = {}
-        upcoming_shows_temp['venue_id'] = upcoming_shows.venue_id
-        upcoming_shows_temp['venue_name'] = upcoming_shows.venue.name
-        upcoming_shows_temp['start_time'] = upcoming_shows.start_time
-        upcoming_shows_temp['venue_image_link'] = upcoming_shows.venue.image_link
-        upcoming_shows_temp['venue_name'] = upcoming_shows.venue.name
-        
-        data['upcoming_shows'].append(upcoming_shows_temp)
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    }
 
     return render_template('pages/show_artist.html', artist=data)
 
@@ -310,6 +539,7 @@ def edit_artist_submission(artist_id):
                         
         db.session.add(artist)
         db.session.commit()
+        artist_written(artist_id, show_counterparts(Show.artist_id, artist_id, Show.venue_id))
     except:
         db.session.rollback()
         error = True
@@ -355,6 +585,7 @@ def edit_venue_submission(venue_id):
                         
         db.session.add(venue)
         db.session.commit()
+        venue_written(venue_id, show_counterparts(Show.venue_id, venue_id, Show.artist_id))
     except:
         db.session.rollback()
         error = True
@@ -398,6 +629,7 @@ def create_artist_submission():
                         seeking_description=form.seeking_description.data)
         db.session.add(artist)
         db.session.commit()
+        artist_written()
     except:
         db.session.rollback()
         error = True
@@ -416,23 +648,28 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@page_cache.cached(tags=lambda: ['show-list'])
 def shows():
-    # displays list of shows at /shows
-    shows = Show.query.join(Artist).join(Venue).all()
-
-    data = []
-    for show in shows:
-        show_temp = {}
-        show_temp["venue_id"] = show.venue_id
-        show_temp["venue_name"] = show.venue.name
-        show_temp["artist_id"] = show.artist_id
-        show_temp["artist_name"] = show.artist.name
-        show_temp["artist_image_link"] = show.artist.image_link
-        show_temp["start_time"] = show.start_time
-        
-        data.append(show_temp)
-
-    return render_template('pages/shows.html', shows=data)
+    # displays list of shows at /shows, one keyset page at a time
+    after, before = page_cursors(SHOW_KEY)
+    # only the columns a show tile needs, so no Show/Artist/Venue entities are built
+    shows_query = db.session.query(Show.id,
+                                   Show.start_time,
+                                   Show.venue_id,
+                                   Venue.name.label('venue_name'),
+                                   Show.artist_id,
+                                   Artist.name.label('artist_name'),
+                                   Artist.image_link.label('artist_image_link')) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+    page = keyset_page(shows_query,
+                       (Show.start_time, Show.id),
+                       key=lambda row: (row.start_time, row.id),
+                       per_page=page_size(app.config['SHOWS_PER_PAGE']),
+                       after=after,
+                       before=before)
+
+    return render_template('pages/shows.html', shows=page.items, page=page)
 
 @app.route('/shows/create')
 def create_shows():
@@ -455,6 +692,7 @@ def create_show_submission():
         
         db.session.add(show)
         db.session.commit()
+        show_written(form.venue_id.data, form.artist_id.data)
     except:
         db.session.rollback()
         error = True
@@ -468,6 +706,59 @@ def create_show_submission():
 
     return redirect(url_for('index'))
 
+#  Import
+#  ----------------------------------------------------------------
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_rows(kind):
+    # the request body is the file, read as it arrives: POST it as text/csv or
+    # application/x-ndjson with an "Authorization: Bearer <IMPORT_TOKEN>" header
+    token = app.config['IMPORT_TOKEN']
+    if not token or kind not in importer.KINDS:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        abort(401)
+    format_ = request.args.get('format')
+    if format_ is None:
+        format_ = 'jsonl' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv'
+    if format_ not in importer.FORMATS:
+        abort(400)
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    report = importer.import_rows(kind, stream, format_,
+                                  batch_size=max(1, request.args.get('batch_size', app.config['IMPORT_BATCH_SIZE'], type=int)),
+                                  max_errors=app.config['IMPORT_MAX_ERRORS'])
+    rows_imported(kind)
+    return app.response_class(json.dumps(report.as_dict()), mimetype='application/json')
+
+#  Export
+#  ----------------------------------------------------------------
+
+def export_bound(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+@app.route('/export/<kind>.<format_>')
+def export_rows(kind, format_):
+    # streamed as it is read: GET with an "Authorization: Bearer <EXPORT_TOKEN>"
+    # header, filtered by ?since=&until= (ISO dates, shows only), ?city=&state=
+    token = app.config['EXPORT_TOKEN']
+    if not token or kind not in exporter.KINDS or format_ not in exporter.FORMATS:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        abort(401)
+    chunks = exporter.stream(kind, format_, app.config['EXPORT_BATCH_SIZE'],
+                             since=export_bound('since'), until=export_bound('until'),
+                             city=request.args.get('city'), state=request.args.get('state'))
+    response = Response(stream_with_context(chunks), mimetype=exporter.MIMETYPES[format_])
+    response.headers['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(kind, format_)
+    return response
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -478,14 +769,11 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    log_handler = setup_logging(app)
+    metrics.gauge('log_records_dropped', 'Log records dropped because the log queue was full.',
+                  lambda: log_handler.dropped)
     app.logger.info('errors')
+app.logger.info('startup: %s', config.describe(app.config))
 
 #----------------------------------------------------------------------------#
 # Launch.
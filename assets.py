@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from flask import request, url_for, send_from_directory, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# `flask assets build` concatenates and minifies the bundles below into
+# static/dist/<name>.<content hash>.<ext>, writes .gz (and .br when the brotli
+# package is installed) siblings next to each and records the hashed names in
+# static/dist/manifest.json. Templates link bundles through asset_urls(); built
+# bundles are served with far-future immutable caching, the precompressed file
+# picked from Accept-Encoding. Without a build, the source files are linked
+# one by one as before.
+#
+# static/dist sits at the same depth as static/css, so relative url()s such as
+# ../fonts/... keep resolving.
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred: kept in the order the separate deferred tags used to run in
+    'app.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    return rjsmin.jsmin(js) if rjsmin is not None else js
+
+
+def build(static_folder):
+    """Write every bundle with its compressed siblings and return the manifest."""
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        stem, ext = os.path.splitext(name)
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        if ext == '.css':
+            content = '\n'.join(minify_css(part) for part in parts)
+        else:
+            # a statement terminator between files, in case one lacks a final ';'
+            content = '\n;\n'.join(minify_js(part) for part in parts)
+        data = content.encode('utf-8')
+
+        filename = '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], ext)
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.gz', 'wb') as f:
+            # mtime=0 keeps the output byte-for-byte reproducible
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+                gz.write(data)
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[name] = filename
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.load()
+        app.add_url_rule('/static/{}/<path:filename>'.format(DIST), 'dist_asset', self.serve)
+        app.jinja_env.globals['asset_urls'] = self.urls
+
+        @app.cli.group('assets')
+        def assets_command():
+            """Build the static asset bundles."""
+
+        @assets_command.command('build')
+        def build_command():
+            """Bundle, minify, fingerprint and precompress static assets."""
+            self.manifest = build(app.static_folder)
+            for name, filename in sorted(self.manifest.items()):
+                print('{} -> {}/{}'.format(name, DIST, filename))
+
+    def load(self):
+        path = os.path.join(self.app.static_folder, DIST, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+
+    def urls(self, name):
+        """Urls to link for bundle `name`: the built bundle, else its sources."""
+        filename = self.manifest.get(name)
+        if filename is not None:
+            return [url_for('dist_asset', filename=filename)]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        directory = os.path.join(self.app.static_folder, DIST)
+        if not os.path.isfile(os.path.join(directory, filename)):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            # an encoding listed with q=0 is one the client refuses
+            if request.accept_encodings[encoding] > 0 and os.path.isfile(os.path.join(directory, filename + suffix)):
+                response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=31536000)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(directory, filename, mimetype=mimetype, max_age=31536000)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,253 @@
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# Name prefixes of venues and artists, answered from memory. Each kind has a
+# PrefixIndex: two sorted arrays of (key, id), one keyed by the whole name and
+# one by every later word of it ("blue note" for "The Blue Note"), so a lookup
+# is a bisect plus a walk over at most `limit` matches. Whole-name matches
+# rank before word matches.
+#  * start_rebuilder() builds the indexes on a daemon thread at startup and
+#    again every AUTOCOMPLETE_REBUILD_INTERVAL seconds, which also picks up
+#    writes made by other processes. Lookups keep using the old indexes until
+#    the new ones are swapped in, and fall back to the database before the
+#    first build.
+#  * Every commit that inserts, renames or deletes a venue or artist updates
+#    them in place (the session listeners below), including a commit made
+#    while a rebuild is running.
+# Bulk imports bypass the session and ask for a rebuild instead.
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def word_keys(name):
+    # the name from each word after the first one on
+    key = normalize(name)
+    return [key[match.start():] for match in re.finditer(r'(?<=\s)\S', key)]
+
+
+def entry_bytes(entry_id, name):
+    # the name and id, and a (key, id) tuple and key string per array entry
+    keys = [normalize(name)] + word_keys(name)
+    return sys.getsizeof(name) + sys.getsizeof(entry_id) + \
+        sum(sys.getsizeof(key) + sys.getsizeof((key, entry_id)) for key in keys)
+
+
+class PrefixIndex:
+    def __init__(self, rows=()):
+        rows = [(row[0], row[1]) for row in rows]
+        self.names = dict(rows)
+        self.full = sorted((normalize(name), entry_id) for entry_id, name in rows)
+        self.words = sorted((key, entry_id) for entry_id, name in rows for key in word_keys(name))
+        self.entry_bytes = sum(entry_bytes(entry_id, name) for entry_id, name in rows)
+
+    def __len__(self):
+        return len(self.names)
+
+    def put(self, entry_id, name):
+        self.remove(entry_id)
+        self.names[entry_id] = name
+        self.entry_bytes += entry_bytes(entry_id, name)
+        insort(self.full, (normalize(name), entry_id))
+        for key in word_keys(name):
+            insort(self.words, (key, entry_id))
+
+    def remove(self, entry_id):
+        name = self.names.pop(entry_id, None)
+        if name is None:
+            return
+        self.entry_bytes -= entry_bytes(entry_id, name)
+        self._discard(self.full, (normalize(name), entry_id))
+        for key in word_keys(name):
+            self._discard(self.words, (key, entry_id))
+
+    @staticmethod
+    def _discard(keys, item):
+        i = bisect_left(keys, item)
+        if i < len(keys) and keys[i] == item:
+            del keys[i]
+
+    def search(self, prefix, limit):
+        """[(rank, key, id)] of up to `limit` entries with a name or word starting with `prefix`."""
+        hits = []
+        seen = set()
+        for rank, keys in enumerate((self.full, self.words)):
+            i = bisect_left(keys, (prefix,))
+            while i < len(keys) and len(hits) < limit and keys[i][0].startswith(prefix):
+                key, entry_id = keys[i]
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    hits.append((rank, key, entry_id))
+                i += 1
+        return hits
+
+    def memory_bytes(self):
+        """Approximate size of the arrays and name map with everything they hold."""
+        return self.entry_bytes + sys.getsizeof(self.names) + sys.getsizeof(self.full) + sys.getsizeof(self.words)
+
+
+_indexes = None
+_lock = threading.Lock()
+# changes committed while a rebuild reads the tables, replayed onto its result
+_replay = None
+_built_at = None
+_build_seconds = None
+_rebuild_requested = threading.Event()
+
+
+def ready():
+    return _indexes is not None
+
+
+def _apply(indexes, changes):
+    for kind, entry_id, name in changes:
+        if name is None:
+            indexes[kind].remove(entry_id)
+        else:
+            indexes[kind].put(entry_id, name)
+
+
+def update(changes):
+    """Apply committed [(kind, id, name or None for a delete)]."""
+    with _lock:
+        if _replay is not None:
+            _replay.extend(changes)
+        if _indexes is not None:
+            _apply(_indexes, changes)
+
+
+def rebuild():
+    """Build fresh indexes from the tables and swap them in."""
+    global _indexes, _replay, _built_at, _build_seconds
+    started = time.perf_counter()
+    with _lock:
+        _replay = []
+    try:
+        indexes = {kind: PrefixIndex(db.session.query(model.id, model.name))
+                   for model, kind in KINDS.items()}
+        db.session.rollback()
+        with _lock:
+            _apply(indexes, _replay)
+            _indexes = indexes
+    finally:
+        with _lock:
+            _replay = None
+    _built_at = time.time()
+    _build_seconds = time.perf_counter() - started
+    return sum(len(index) for index in indexes.values())
+
+
+def request_rebuild():
+    # called after writes that bypass the session
+    _rebuild_requested.set()
+
+
+def start_rebuilder(app, interval):
+    """Build the indexes now, then every `interval` seconds or on request_rebuild()."""
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    rebuild()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('autocomplete index rebuild failed')
+                finally:
+                    db.session.remove()
+            _rebuild_requested.wait(interval)
+            _rebuild_requested.clear()
+
+    thread = threading.Thread(target=run, name='autocomplete-rebuild', daemon=True)
+    thread.start()
+    return thread
+
+
+def complete(term, limit=10, kinds=('venue', 'artist')):
+    """[(kind, id, name)] of up to `limit` venues and artists whose name, or a word of it, starts with `term`."""
+    prefix = normalize(term)
+    if not prefix:
+        return []
+    indexes = _indexes
+    if indexes is None:
+        return _complete_from_tables(prefix, limit, kinds)
+    hits = []
+    with _lock:
+        for kind in kinds:
+            index = indexes[kind]
+            hits += [(rank, key, kind, entry_id, index.names[entry_id])
+                     for rank, key, entry_id in index.search(prefix, limit)]
+    hits.sort()
+    return [(kind, entry_id, name) for rank, key, kind, entry_id, name in hits[:limit]]
+
+
+def _complete_from_tables(prefix, limit, kinds):
+    # before the first build: whole-name prefixes only
+    pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    hits = []
+    for model, kind in KINDS.items():
+        if kind in kinds:
+            rows = db.session.query(model.id, model.name) \
+                .filter(model.name.ilike(pattern, escape='\\')) \
+                .order_by(model.name, model.id) \
+                .limit(limit)
+            hits += [(normalize(row.name), kind, row.id, row.name) for row in rows]
+    hits.sort()
+    return [(kind, entry_id, name) for key, kind, entry_id, name in hits[:limit]]
+
+
+def stats():
+    indexes = _indexes
+    if indexes is None:
+        return {'ready': False}
+    with _lock:
+        result = {kind: {'entries': len(index),
+                         'keys': len(index.full) + len(index.words),
+                         'memory_bytes': index.memory_bytes()} for kind, index in indexes.items()}
+    result.update(ready=True,
+                  memory_bytes=sum(result[kind]['memory_bytes'] for kind in indexes),
+                  built_at=_built_at,
+                  build_seconds=_build_seconds)
+    return result
+
+#  Session listeners
+#  ----------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def collect_flushed_names(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if type(obj) in KINDS:
+            changes.append((KINDS[type(obj)], obj.id, obj.name))
+    for obj in session.dirty:
+        if type(obj) in KINDS and obj not in session.deleted and inspect(obj).attrs.name.history.has_changes():
+            changes.append((KINDS[type(obj)], obj.id, obj.name))
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            changes.append((KINDS[type(obj)], obj.id, None))
+    if changes:
+        session.info.setdefault('autocomplete', []).extend(changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_committed_names(session):
+    changes = session.info.pop('autocomplete', None)
+    if changes:
+        update(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_rolled_back_names(session):
+    session.info.pop('autocomplete', None)
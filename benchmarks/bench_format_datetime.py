@@ -0,0 +1,85 @@
+"""Micro-benchmark for the `datetime` template filter.
+
+Renders pages/shows.html with 10k show tiles, once with the original
+babel.dates.format_datetime based filter and once with DatetimeFormatter.
+
+    python benchmarks/bench_format_datetime.py [--shows 10000] [--distinct 2000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# rendered pages must not queue thumbnail fetches of the synthetic image links
+os.environ.setdefault('IMAGE_WORKERS', '0')
+
+import babel.dates
+import dateutil.parser
+from flask import render_template
+from app import app
+from formatting import DatetimeFormatter
+from pagination import Page
+
+
+def legacy_format_datetime(value, format='medium'):
+    # the filter as it was before formatting.py
+    if isinstance(value, str):
+        date = dateutil.parser.parse(value)
+    else:
+        date = value
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def make_shows(count, distinct):
+    # shows cluster on a limited number of start times (evening slots), like real listings
+    start = datetime(2026, 1, 1, 20, 0)
+    return [{
+        'venue_id': i % 500,
+        'venue_name': 'Venue {}'.format(i % 500),
+        'artist_id': i % 2000,
+        'artist_name': 'Artist {}'.format(i % 2000),
+        'artist_image_link': 'https://example.com/{}.jpg'.format(i % 2000),
+        'start_time': start + timedelta(hours=i % distinct),
+    } for i in range(count)]
+
+
+def render(shows, repeat, make_filter):
+    # a fresh filter per run, so memoized output never carries over between runs
+    timings = []
+    with app.test_request_context('/shows'):
+        for _ in range(repeat):
+            app.jinja_env.filters['datetime'] = make_filter()
+            started = time.perf_counter()
+            render_template('pages/shows.html', shows=shows, page=Page(shows))
+            timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--distinct', type=int, default=2000, help='distinct start times')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    shows = make_shows(args.shows, args.distinct)
+    sample = shows[0]['start_time']
+    assert legacy_format_datetime(sample, 'full') == DatetimeFormatter(locale='en')(sample, 'full')
+
+    legacy = render(shows, args.repeat, lambda: legacy_format_datetime)
+    current = render(shows, args.repeat, lambda: DatetimeFormatter(locale='en'))
+
+    print('{} shows, {} distinct start times, best of {}'.format(args.shows, args.distinct, args.repeat))
+    print('  babel.dates.format_datetime : {:8.1f} ms'.format(legacy * 1000))
+    print('  DatetimeFormatter           : {:8.1f} ms'.format(current * 1000))
+    print('  speedup                     : {:8.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Check that the views' queries use the indexes from migration c5a8f2e9d1b4.
+
+Drives every read view through the Flask test client against the configured
+PostgreSQL database, captures the SQL each one issues and runs
+EXPLAIN (ANALYZE, FORMAT JSON) on it inside a rolled back transaction. Prints
+the indexes each plan uses and exits non-zero when a view misses one it should
+be using. Run it against a realistically sized database: on a handful of rows
+the planner rightly prefers sequential scans.
+
+    python benchmarks/explain_indexes.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# rendered pages must not queue thumbnail fetches of the synthetic image links
+os.environ.setdefault('IMAGE_WORKERS', '0')
+
+from sqlalchemy import event
+from app import app, db, page_cache
+from models import Venue, Artist
+
+# (label, method, url or url factory, form data, indexes the plan should use)
+CHECKS = [
+    ('index', 'GET', '/', None, {'Venue_pkey', 'Artist_pkey'}),
+    ('venues', 'GET', '/venues', None, {'ix_Venue_city_state_name'}),
+    ('artists', 'GET', '/artists', None, {'ix_Artist_name_id'}),
+    ('shows', 'GET', '/shows', None, {'ix_Show_start_time_id'}),
+    ('show_venue', 'GET', lambda ids: '/venues/{}'.format(ids['venue']), None, {'ix_Show_venue_id_start_time'}),
+    ('show_artist', 'GET', lambda ids: '/artists/{}'.format(ids['artist']), None, {'ix_Show_artist_id_start_time'}),
+    ('search_venues', 'POST', '/venues/search', {'search_term': 'music'}, {'ix_Venue_name_trgm'}),
+    ('search_artists', 'POST', '/artists/search', {'search_term': 'band'}, {'ix_Artist_name_trgm'}),
+]
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(connection, statement, parameters):
+    rows = connection.exec_driver_sql('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement, parameters).scalar()
+    plan = (json.loads(rows) if isinstance(rows, str) else rows)[0]['Plan']
+    nodes = list(plan_nodes(plan))
+    indexes = {node['Index Name'] for node in nodes if 'Index Name' in node}
+    seq_scans = {node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'}
+    return indexes, seq_scans
+
+
+def main():
+    page_cache.enabled = False
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    captured = []
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            sys.exit('explain_indexes.py needs PostgreSQL, not {}'.format(engine.dialect.name))
+        ids = {'venue': db.session.query(db.func.min(Venue.id)).scalar(),
+               'artist': db.session.query(db.func.min(Artist.id)).scalar()}
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+        event.listen(engine, 'before_cursor_execute', capture)
+
+        failed = False
+        for label, method, url, data, expected in CHECKS:
+            captured.clear()
+            url = url(ids) if callable(url) else url
+            response = client.open(url, method=method, data=data)
+            used, scanned = set(), set()
+            with engine.connect() as connection:
+                transaction = connection.begin()
+                for statement, parameters in list(captured):
+                    indexes, seq_scans = explain(connection, statement, parameters)
+                    used |= indexes
+                    scanned |= seq_scans
+                transaction.rollback()
+            missing = expected - used
+            failed = failed or bool(missing)
+            print('{:<15} {} {:>3} statements  indexes: {}'.format(
+                label, response.status_code, len(captured), ', '.join(sorted(used)) or '-'))
+            if scanned:
+                print('{:<15} seq scans on: {}'.format('', ', '.join(sorted(scanned))))
+            if missing:
+                print('{:<15} MISSING: {}'.format('', ', '.join(sorted(missing))))
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""Reproducible load test of every route in app.py.
+
+Seeds a synthetic dataset (N venues, M artists, K shows spread over cities,
+genres and a year either side of today), drives each route through Flask's
+test client and records per route latency percentiles, SQL statements per
+request and peak Python memory. Results go to a JSON file with stable keys, so
+two runs can be diffed; --baseline prints the routes whose statement count or
+p95 latency grew against an earlier run. Routes left out on purpose are listed
+in EXCLUDED with the reason; any other route without a scenario is warned about.
+
+    python benchmarks/loadtest.py --venues 200 --artists 500 --shows 5000 \
+        --requests 50 --output bench.json [--baseline previous.json]
+
+The database defaults to a throwaway SQLite file; pass --database (or set
+BENCH_DATABASE_URI) to run against PostgreSQL. The seeded tables are dropped
+and recreated, so never point it at a database you care about.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# rendered pages must not queue thumbnail fetches of the synthetic image links
+os.environ.setdefault('IMAGE_WORKERS', '0')
+
+from sqlalchemy import event
+from app import app, page_cache
+from models import db, Venue, Artist, Show
+from genres import GENRES, mask_of
+import counters
+import facets
+import autocomplete
+
+# flask_wtf.Form warns on every form instantiation
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+          ('Seattle', 'WA'), ('Nashville', 'TN'), ('Denver', 'CO'), ('Boston', 'MA')]
+# routes with no scenario, and why
+EXCLUDED = {
+    'static': 'files from the static folder, served by the web server in production',
+    'dist_asset': 'fingerprinted files from `flask assets build`, read from disk with no database work',
+    'thumbnail': 'files fetched from remote image links in the background, so their timing measures the network',
+}
+# the import and export routes are enabled for the run with this token
+TOKEN = 'loadtest'
+IMPORT_ROWS = 20
+WORDS = ['Blue', 'Red', 'Golden', 'Silver', 'Velvet', 'Electric', 'Midnight', 'Neon', 'Wild', 'Lucky',
+         'Moon', 'River', 'Garden', 'Hall', 'Room', 'Club', 'Lounge', 'Band', 'Trio', 'Collective']
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def seed(rng, venues, artists, shows, batch=1000):
+    db.drop_all()
+    db.create_all()
+
+    def name(index):
+        return '{} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), index)
+
+    def insert(table, rows):
+        for start in range(0, len(rows), batch):
+            db.session.execute(table.insert(), rows[start:start + batch])
+
+    insert(Venue.__table__, [dict(
+        name=name(i), city=city, state=state, address='{} Main St'.format(i), phone='415-555-0100',
+        image_link='https://example.com/venue/{}.jpg'.format(i), facebook_link='https://facebook.com/v{}'.format(i),
+        website='https://venue{}.example.com'.format(i), seeking_talent=rng.random() < 0.5,
+        seeking_description='Looking for bands', genre_mask=mask_of(rng.sample(GENRES, 3)),
+        past_shows_count=0, upcoming_shows_count=0, num_upcoming_shows=0)
+        for i, (city, state) in ((i, rng.choice(CITIES)) for i in range(venues))])
+    insert(Artist.__table__, [dict(
+        name=name(i), city=city, state=state, phone='415-555-0199',
+        image_link='https://example.com/artist/{}.jpg'.format(i), facebook_link='https://facebook.com/a{}'.format(i),
+        website='https://artist{}.example.com'.format(i), seeking_venue=rng.random() < 0.5,
+        seeking_description='Looking for gigs', genre_mask=mask_of(rng.sample(GENRES, 2)),
+        past_shows_count=0, upcoming_shows_count=0)
+        for i, (city, state) in ((i, rng.choice(CITIES)) for i in range(artists))])
+    now = datetime.now().replace(microsecond=0)
+    insert(Show.__table__, [dict(
+        venue_id=rng.randint(1, venues), artist_id=rng.randint(1, artists),
+        start_time=now + timedelta(hours=rng.randint(-24 * 365, 24 * 365)))
+        for _ in range(shows)])
+    db.session.commit()
+    counters.recount_all()
+    facets.rebuild()
+    autocomplete.rebuild()
+
+
+def venue_form(rng, index):
+    city, state = rng.choice(CITIES)
+    return {'name': 'Bench Venue {}'.format(index), 'city': city, 'state': state, 'address': '1 Bench St',
+            'phone': '415-555-0123', 'genres': rng.sample(GENRES, 2), 'facebook_link': 'https://facebook.com/bench',
+            'image_link': 'https://example.com/bench.jpg', 'website_link': 'https://bench.example.com',
+            'seeking_talent': 'y', 'seeking_description': 'benchmark'}
+
+
+def artist_form(rng, index):
+    form = venue_form(rng, index)
+    del form['address'], form['seeking_talent']
+    form['name'] = 'Bench Artist {}'.format(index)
+    form['seeking_venue'] = 'y'
+    return form
+
+
+def scenarios(rng, args):
+    """(label, endpoint, method, url factory, form data factory) for every route."""
+    venue_id = lambda i: rng.randint(1, args.venues)
+    artist_id = lambda i: rng.randint(1, args.artists)
+    term = lambda i: {'search_term': rng.choice(WORDS).lower()}
+    start = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    # deletes go to venues nobody else touches, from the top of the id range down
+    doomed = iter(range(args.venues, 0, -1))
+    return [
+        ('index', 'index', 'GET', lambda i: '/', None),
+        ('venues', 'venues', 'GET', lambda i: '/venues', None),
+        ('artists', 'artists', 'GET', lambda i: '/artists', None),
+        ('shows', 'shows', 'GET', lambda i: '/shows', None),
+        ('show_venue', 'show_venue', 'GET', lambda i: '/venues/{}'.format(venue_id(i)), None),
+        ('show_artist', 'show_artist', 'GET', lambda i: '/artists/{}'.format(artist_id(i)), None),
+        ('api_venues', 'api.venues', 'GET', lambda i: '/api/v1/venues', None),
+        ('api_artists', 'api.artists', 'GET', lambda i: '/api/v1/artists', None),
+        ('api_shows', 'api.shows', 'GET', lambda i: '/api/v1/shows', None),
+        ('api_venue', 'api.venue', 'GET', lambda i: '/api/v1/venues/{}'.format(venue_id(i)), None),
+        ('api_artist', 'api.artist', 'GET', lambda i: '/api/v1/artists/{}'.format(artist_id(i)), None),
+        ('search_venues', 'search_venues', 'POST', lambda i: '/venues/search', term),
+        ('search_artists', 'search_artists', 'POST', lambda i: '/artists/search', term),
+        ('autocomplete', 'autocomplete_names', 'GET',
+         lambda i: '/autocomplete?q={}'.format(term(i)['search_term'][:3]), None),
+        ('create_venue_form', 'create_venue_form', 'GET', lambda i: '/venues/create', None),
+        ('create_artist_form', 'create_artist_form', 'GET', lambda i: '/artists/create', None),
+        ('create_shows', 'create_shows', 'GET', lambda i: '/shows/create', None),
+        ('edit_venue', 'edit_venue', 'GET', lambda i: '/venues/{}/edit'.format(venue_id(i)), None),
+        ('edit_artist', 'edit_artist', 'GET', lambda i: '/artists/{}/edit'.format(artist_id(i)), None),
+        ('create_venue_submission', 'create_venue_submission', 'POST', lambda i: '/venues/create',
+         lambda i: venue_form(rng, i)),
+        ('create_artist_submission', 'create_artist_submission', 'POST', lambda i: '/artists/create',
+         lambda i: artist_form(rng, i)),
+        ('create_show_submission', 'create_show_submission', 'POST', lambda i: '/shows/create',
+         lambda i: {'venue_id': str(venue_id(i)), 'artist_id': str(artist_id(i)), 'start_time': start}),
+        ('edit_venue_submission', 'edit_venue_submission', 'POST',
+         lambda i: '/venues/{}/edit'.format(venue_id(i)), lambda i: venue_form(rng, i)),
+        ('edit_artist_submission', 'edit_artist_submission', 'POST',
+         lambda i: '/artists/{}/edit'.format(artist_id(i)), lambda i: artist_form(rng, i)),
+        ('delete_venue', 'delete_venue', 'DELETE', lambda i: '/venues/{}'.format(next(doomed)), None),
+        ('import_shows', 'import_rows', 'POST', lambda i: '/import/shows?format=jsonl',
+         lambda i: ''.join(json.dumps({'venue_id': venue_id(i), 'artist_id': artist_id(i), 'start_time': start}) + '\n'
+                           for _ in range(IMPORT_ROWS))),
+        ('export_venues', 'export_rows', 'GET', lambda i: '/export/venues.csv', None),
+        ('export_shows', 'export_rows', 'GET', lambda i: '/export/shows.jsonl', None),
+        ('metrics', 'metrics', 'GET', lambda i: '/metrics', None),
+    ]
+
+
+def csrf_token(client):
+    # the forms render their csrf field, so the token comes from one of them
+    page = client.get('/shows/create').get_data(as_text=True)
+    return re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+
+
+def with_csrf(data, token):
+    # form posts carry the token; raw bodies (imports) are sent as they are
+    return dict(data, csrf_token=token) if isinstance(data, dict) else data
+
+
+def run_route(client, engine, method, url, data, requests, warmup):
+    statements = []
+    count = [0]
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        count[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    latencies = []
+    tracemalloc.start()
+    try:
+        for i in range(warmup + requests):
+            count[0] = 0
+            started = time.perf_counter()
+            response = client.open(url(i), method=method, data=data(i) if data else None)
+            # streamed bodies only run their queries as they are read
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 500:
+                raise RuntimeError('{} {} returned {}'.format(method, url(i), response.status_code))
+            if i >= warmup:
+                latencies.append(elapsed * 1000)
+                statements.append(count[0])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'sql_statements_median': statistics.median(statements),
+        'sql_statements_max': max(statements),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['routes']
+    regressions = []
+    for label, current in results.items():
+        previous = baseline.get(label)
+        if previous is None:
+            continue
+        if current['sql_statements_max'] > previous['sql_statements_max']:
+            regressions.append('{}: {} -> {} SQL statements'.format(
+                label, previous['sql_statements_max'], current['sql_statements_max']))
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {} -> {} ms'.format(label, previous['p95_ms'], current['p95_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=os.getenv('BENCH_DATABASE_URI'))
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=50, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--cache', action='store_true', help='keep the page cache enabled')
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--baseline', help='earlier result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth against the baseline')
+    args = parser.parse_args()
+
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'fyyur-bench.db')
+    app.config.update(SQLALCHEMY_DATABASE_URI=database, SHOW_ROLL_FORWARD_INTERVAL=0,
+                      IMPORT_TOKEN=TOKEN, EXPORT_TOKEN=TOKEN)
+    if database.startswith('sqlite'):
+        # the profile's pool settings are for PostgreSQL
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    page_cache.enabled = args.cache
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        seed(rng, args.venues, args.artists, args.shows)
+        engine = db.engine
+    # outside the seeding context, so each request gets its own app context and g
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + TOKEN
+    token = csrf_token(client)
+    routes = [(label, endpoint, method, url, data and (lambda i, data=data: with_csrf(data(i), token)))
+              for label, endpoint, method, url, data in scenarios(rng, args)]
+    covered = {endpoint for label, endpoint, method, url, data in routes}
+    uncovered = {rule.endpoint for rule in app.url_map.iter_rules()} - covered - set(EXCLUDED)
+    if uncovered:
+        print('warning: no scenario for {}'.format(', '.join(sorted(uncovered))))
+
+    results = {}
+    for label, endpoint, method, url, data in routes:
+        results[label] = run_route(client, engine, method, url, data, args.requests, args.warmup)
+        print('{:<26} p50 {p50_ms:>8.2f}  p95 {p95_ms:>8.2f}  p99 {p99_ms:>8.2f} ms  '
+              'sql {sql_statements_median:>5} (max {sql_statements_max:>4})  '
+              'peak {peak_memory_kb:>9.1f} KB'.format(label, **results[label]))
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'database': engine.dialect.name,
+            'python': sys.version.split()[0],
+            'dataset': {'venues': args.venues, 'artists': args.artists, 'shows': args.shows, 'seed': args.seed},
+            'requests': args.requests,
+            'cache': args.cache,
+        },
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print('wrote {}'.format(args.output))
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
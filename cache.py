@@ -0,0 +1,206 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, session
+from routing import read_primary
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Rendered pages are cached under their url and labelled with tags naming the
+# data they were built from ('venue-list', 'venue:3', ...). Write views
+# invalidate the tags they touch, which drops exactly the pages built from that
+# data. Entries also expire after a TTL, and the in-process backend evicts the
+# least recently used page once it holds max_entries.
+#
+# A page is rendered from the primary, never a replica that may not have the
+# latest write yet. Every invalidation bumps a generation number per tag, and a
+# page is only stored if its tags' generations did not change while it was
+# rendered, so a page built from data read just before a write cannot be cached
+# after that write's invalidation.
+#
+# The in-process backend is per worker: an invalidation reaches only the process
+# that made the write. Deployments with several workers want the Redis backend.
+
+
+class LocalBackend:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.generations = {}
+        self.cleared = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires, tags = entry
+            if expires < time.monotonic():
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def generation(self, tags):
+        with self.lock:
+            return self._generation(tags)
+
+    def set(self, key, value, ttl, tags=(), generation=None):
+        """Store the page, unless `generation` is given and its tags were invalidated since."""
+        with self.lock:
+            if generation is not None and generation != self._generation(tags):
+                return False
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (value, time.monotonic() + ttl, tuple(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+            return True
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+                for key in self.tags.pop(tag, ()):
+                    self._drop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.cleared += 1
+
+    def _generation(self, tags):
+        return [self.cleared] + [self.generations.get(tag, 0) for tag in tags]
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RedisBackend:
+    """Shared backend for several workers; needs the optional `redis` package."""
+
+    def __init__(self, url, prefix='fyyur:'):
+        import redis
+        self.redis = redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def generation(self, tags, client=None):
+        values = (client or self.client).mget(self._generation_keys(tags))
+        return [int(value or 0) for value in values]
+
+    def set(self, key, value, ttl, tags=(), generation=None):
+        """Store the page, unless `generation` is given and its tags were invalidated since."""
+        with self.client.pipeline() as pipe:
+            try:
+                if generation is not None:
+                    # a concurrent invalidate() bumps a watched key and fails the EXEC
+                    pipe.watch(*self._generation_keys(tags))
+                    if self.generation(tags, pipe) != generation:
+                        return False
+                pipe.multi()
+                pipe.set(self.prefix + key, pickle.dumps(value), ex=int(ttl))
+                for tag in tags:
+                    pipe.sadd(self.prefix + 'tag:' + tag, key)
+                    pipe.expire(self.prefix + 'tag:' + tag, int(ttl))
+                pipe.execute()
+            except self.redis.WatchError:
+                return False
+        return True
+
+    def invalidate(self, tags):
+        for tag in tags:
+            # bump first, so a page stored after the keys are read below fails its check
+            self.client.incr(self.prefix + 'gen:' + tag)
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self.client.smembers(tag_key)
+            pipe = self.client.pipeline()
+            for key in keys:
+                pipe.delete(self.prefix + key.decode())
+            pipe.delete(tag_key)
+            pipe.execute()
+
+    def clear(self):
+        self.client.incr(self.prefix + 'gen:')
+        keys = [key for key in self.client.scan_iter(self.prefix + '*')
+                if not key.decode().startswith(self.prefix + 'gen:')]
+        if keys:
+            self.client.delete(*keys)
+
+    def _generation_keys(self, tags):
+        # 'gen:' alone counts clear() calls
+        return [self.prefix + 'gen:'] + [self.prefix + 'gen:' + tag for tag in tags]
+
+
+class PageCache:
+    def __init__(self, backend, default_ttl=60, enabled=True):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+
+    def cached(self, tags, ttl=None):
+        """Cache the rendered output of a GET view under the request url.
+
+        `tags` is called with the view arguments and returns the tags to label
+        the page with. A miss is rendered reading from the primary. Pages are
+        neither served from nor stored in the cache while the session has
+        flashed messages waiting to be shown, and not stored when rendering set
+        g.page_cache_nostore or one of the tags was invalidated meanwhile.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self.enabled or request.method != 'GET' or session.get('_flashes'):
+                    return view(**kwargs)
+                key = request.full_path
+                page = self.backend.get(key)
+                if page is not None:
+                    g.page_cache = 'hit'
+                    return page
+                g.page_cache = 'miss'
+                page_tags = tags(**kwargs)
+                generation = self.backend.generation(page_tags)
+                with read_primary():
+                    page = view(**kwargs)
+                if isinstance(page, str) and not g.get('page_cache_nostore'):
+                    self.backend.set(key, page, ttl or self.default_ttl, page_tags, generation)
+                return page
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        self.backend.invalidate(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def create(config):
+    if config.get('CACHE_TYPE') == 'redis':
+        backend = RedisBackend(config['CACHE_REDIS_URL'])
+    else:
+        backend = LocalBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+    return PageCache(backend,
+                     default_ttl=config.get('CACHE_DEFAULT_TTL', 60),
+                     enabled=config.get('CACHE_TYPE') != 'null')
@@ -1,11 +1,16 @@
 import os
 
-SECRET_KEY = os.urandom(32)
+SECRET_KEY = os.getenv('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Settings below are shared by every environment; the profile picked by
+# FYYUR_ENV (development, test or production, see PROFILES at the bottom) is
+# applied on top of them.
+PROFILE = os.getenv('FYYUR_ENV', 'development')
+
+# Debug mode is switched on by the development profile only.
+DEBUG = False
 
 # Connect to the database
 DB_HOST = os.getenv('DB_HOST', 'localhost:5432')
@@ -15,3 +20,194 @@ DB_NAME = os.getenv('DB_NAME', 'fyyurapp')
 DB_PATH ='postgresql+psycopg2://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
 
 SQLALCHEMY_DATABASE_URI = DB_PATH
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Read replicas for GET requests (comma separated urls), and how long after a
+# write the same browser keeps reading from the primary
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv('DB_REPLICA_URIS', '').split(',') if uri]
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+
+# Pagination
+SHOWS_PER_PAGE = int(os.getenv('SHOWS_PER_PAGE', 30))
+ARTISTS_PER_PAGE = int(os.getenv('ARTISTS_PER_PAGE', 50))
+MAX_PER_PAGE = 100
+
+# Search
+SEARCH_PER_PAGE = int(os.getenv('SEARCH_PER_PAGE', 20))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 200))
+
+# Show counters: seconds between roll-forward runs, 0 disables the in-process job
+SHOW_ROLL_FORWARD_INTERVAL = int(os.getenv('SHOW_ROLL_FORWARD_INTERVAL', 300))
+
+# Autocomplete: the in-memory name index is rebuilt every
+# AUTOCOMPLETE_REBUILD_INTERVAL seconds (0 turns the rebuilder off, leaving
+# lookups on the database)
+AUTOCOMPLETE_REBUILD_INTERVAL = int(os.getenv('AUTOCOMPLETE_REBUILD_INTERVAL', 600))
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', 10))
+
+# Bulk import: rows per executemany/commit, per-row errors kept in a report,
+# and the bearer token the POST /import/<kind> endpoint wants (unset: disabled)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+IMPORT_TOKEN = os.getenv('IMPORT_TOKEN', '')
+
+# Export: rows per server-side cursor fetch and response chunk, and the bearer
+# token GET /export/<kind> wants (unset: disabled)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+EXPORT_TOKEN = os.getenv('EXPORT_TOKEN', '')
+
+# Page cache: 'local' (in-process), 'redis' (shared, needs the redis package) or 'null'.
+# A write only invalidates the local cache of the process that handled it, so
+# with several workers use 'redis' or 'null', or other workers serve stale pages
+# for up to CACHE_DEFAULT_TTL seconds
+CACHE_TYPE = os.getenv('CACHE_TYPE', 'local')
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+
+# Formatted (timestamp, format) pairs kept by the datetime template filter
+DATETIME_FORMAT_CACHE_SIZE = int(os.getenv('DATETIME_FORMAT_CACHE_SIZE', 4096))
+
+# Image thumbnails: remote Venue/Artist image_links are fetched and resized by a
+# pool of background workers (0 turns fetching off) into IMAGE_CACHE_DIR, served
+# from /thumbnails
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(basedir, 'thumbnails'))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 4))
+# Seconds for a whole fetch, redirects included
+IMAGE_FETCH_TIMEOUT = float(os.getenv('IMAGE_FETCH_TIMEOUT', 10))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 20 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40 * 1000 * 1000))
+IMAGE_MAX_REDIRECTS = int(os.getenv('IMAGE_MAX_REDIRECTS', 3))
+# Fetches only connect to public addresses; CIDRs listed here are allowed too
+# (e.g. an internal image host)
+IMAGE_FETCH_ALLOWED_NETWORKS = [network for network in os.getenv('IMAGE_FETCH_ALLOWED_NETWORKS', '').split(',') if network]
+# Seconds before a url that failed to fetch or decode is tried again
+IMAGE_RETRY_SECONDS = int(os.getenv('IMAGE_RETRY_SECONDS', 3600))
+IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', 86400))
+
+# SQL instrumentation: statements allowed per request, per endpoint or by default,
+# and how often one statement shape may repeat before it is reported as an N+1
+SQL_BUDGET_DEFAULT = int(os.getenv('SQL_BUDGET_DEFAULT', 10))
+SQL_BUDGETS = {
+    'index': 2,
+    'venues': 2,
+    'artists': 3,
+    'shows': 1,
+    'show_venue': 1,
+    'show_artist': 1,
+    'search_venues': 4,
+    'search_artists': 4,
+    # one executemany per batch, and a statement per row when a batch is refused
+    'import_rows': None,
+    # none once the index is built
+    'autocomplete_names': 2,
+    # the validator, then the body unless it is a 304
+    'api.venues': 2,
+    'api.artists': 2,
+    'api.shows': 2,
+    'api.venue': 3,
+    'api.artist': 3,
+}
+SQL_NPLUSONE_THRESHOLD = int(os.getenv('SQL_NPLUSONE_THRESHOLD', 5))
+
+# Metrics: clients allowed to scrape /metrics
+METRICS_ALLOWED_ADDRESSES = os.getenv('METRICS_ALLOWED_ADDRESSES', '127.0.0.1,::1').split(',')
+
+# Logging: records go through a bounded queue to a background writer thread.
+# Files rotate at LOG_MAX_BYTES, or on a schedule when LOG_ROTATE_WHEN is set
+# (a TimedRotatingFileHandler `when`, e.g. 'midnight').
+LOG_FILE = os.getenv('LOG_FILE', 'error.log')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+# Share of requests written to the JSON access log, 0 turns it off
+ACCESS_LOG_FILE = os.getenv('ACCESS_LOG_FILE', 'access.log')
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_SAMPLE_RATE', 0))
+
+
+#----------------------------------------------------------------------------#
+# Environment profiles.
+#----------------------------------------------------------------------------#
+
+def engine_options(pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping,
+                   statement_timeout, executemany_mode='values_plus_batch'):
+    """SQLALCHEMY_ENGINE_OPTIONS for PostgreSQL through psycopg2.
+
+    statement_timeout is in milliseconds and enforced by the server for every
+    statement on the connection (0 means none). executemany_mode picks how
+    psycopg2 batches executemany(), e.g. 'values_plus_batch' sends one
+    INSERT .. VALUES (...), (...) per page of rows.
+    """
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pool_pre_ping,
+        'executemany_mode': executemany_mode,
+    }
+    if statement_timeout:
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(statement_timeout)}
+    return options
+
+
+class DevelopmentConfig:
+    DEBUG = True
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', -1)),
+        pool_pre_ping=False,
+        statement_timeout=int(os.getenv('DB_STATEMENT_TIMEOUT', 0)),
+    )
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI', 'sqlite://')
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv('TEST_REPLICA_URIS', '').split(',') if uri]
+    # SQLite gets Flask-SQLAlchemy's defaults; pool sizing does not apply to it
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    CACHE_TYPE = 'null'
+    IMAGE_WORKERS = 0
+    SHOW_ROLL_FORWARD_INTERVAL = 0
+    AUTOCOMPLETE_REBUILD_INTERVAL = 0
+
+
+class ProductionConfig:
+    DEBUG = False
+    # size the pool against the worker count: every process may open up to
+    # pool_size + max_overflow connections
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        pool_pre_ping=os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        statement_timeout=int(os.getenv('DB_STATEMENT_TIMEOUT', 5000)),
+        executemany_mode=os.getenv('DB_EXECUTEMANY_MODE', 'values_plus_batch'),
+    )
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'test': TestConfig,
+    'production': ProductionConfig,
+}
+
+
+def describe(config):
+    """One line summary of the effective database settings, logged at startup."""
+    options = config['SQLALCHEMY_ENGINE_OPTIONS']
+    timeout = options.get('connect_args', {}).get('options', '').rpartition('=')[2] or '0'
+    summary = 'profile={} debug={} database={}'.format(
+        config['PROFILE'], config['DEBUG'], config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0])
+    if 'pool_size' in options:
+        summary += (' pool_size={pool_size} max_overflow={max_overflow} pool_timeout={pool_timeout}s'
+                    ' pool_recycle={pool_recycle}s pre_ping={pool_pre_ping} executemany_mode={executemany_mode}'
+                    ).format(**options)
+        summary += ' statement_timeout={}ms max_connections_per_process={}'.format(
+            timeout, options['pool_size'] + options['max_overflow'])
+    return summary
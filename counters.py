@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import event, inspect, update, select, func, and_, or_, bindparam, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import db, Show, Venue, Artist, Watermark
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.past_shows_count / upcoming_shows_count / num_upcoming_shows and the two
+# Artist counts are kept up to date so listing pages can read them off the row:
+#  * every flush that inserts, moves or deletes shows (including the cascade
+#    from deleting a venue) adjusts the counts of the affected rows in the same
+#    transaction;
+#  * roll_forward() recounts the venues and artists whose shows have started
+#    since its last run, moving them from upcoming to past. Where the last run
+#    got to is kept in Watermark, so a job that was down catches up on its next
+#    run. It is idempotent, so it can run from several workers or overlap with
+#    itself.
+
+COUNT_COLUMNS = {
+    (Venue, 'upcoming'): ('upcoming_shows_count', 'num_upcoming_shows'),
+    (Venue, 'past'): ('past_shows_count',),
+    (Artist, 'upcoming'): ('upcoming_shows_count',),
+    (Artist, 'past'): ('past_shows_count',),
+}
+SHOW_COLUMNS = ('venue_id', 'artist_id', 'start_time')
+
+# the old value of a changed column has to be in the attribute history, even
+# when the column was not loaded before being set
+for _column in SHOW_COLUMNS:
+    event.listen(getattr(Show, _column), 'set', lambda *args: None, active_history=True)
+
+
+def show_counts(venue_id, artist_id, start_time, now):
+    bucket = 'upcoming' if start_time > now else 'past'
+    return [(Venue, venue_id, bucket), (Artist, artist_id, bucket)]
+
+
+@event.listens_for(Session, 'after_flush')
+def count_flushed_shows(session, flush_context):
+    deltas = Counter()
+    now = datetime.now()
+    for sign, objects in ((1, session.new), (-1, session.deleted)):
+        for show in objects:
+            if not isinstance(show, Show):
+                continue
+            for key in show_counts(show.venue_id, show.artist_id, show.start_time, now):
+                deltas[key] += sign
+    for show in session.dirty:
+        if not isinstance(show, Show) or show in session.deleted:
+            continue
+        attrs = inspect(show).attrs
+        if not any(attrs[column].history.has_changes() for column in SHOW_COLUMNS):
+            continue
+        old, new = [], []
+        for column in SHOW_COLUMNS:
+            added, unchanged, deleted = attrs[column].history
+            old.append((deleted or unchanged or [None])[0])
+            new.append((added or unchanged or [None])[0])
+        for key in show_counts(*old, now):
+            deltas[key] -= 1
+        for key in show_counts(*new, now):
+            deltas[key] += 1
+
+    # one executemany per counter column set, however many rows it touches
+    batches = {}
+    for (model, entity_id, bucket), delta in sorted(deltas.items(), key=lambda item: item[0][1]):
+        if delta:
+            batches.setdefault((model, bucket), []).append({'entity_id': entity_id, 'delta': delta})
+    for (model, bucket), params in batches.items():
+        table = model.__table__
+        values = {column: table.c[column] + bindparam('delta') for column in COUNT_COLUMNS[(model, bucket)]}
+        session.connection().execute(
+            update(table).where(table.c.id == bindparam('entity_id')).values(**values), params)
+
+
+def _recount(model, show_fk, now, since=None, ids=None):
+    table = model.__table__
+    shows = Show.__table__
+    fk = shows.c[show_fk]
+
+    def count_where(condition):
+        return select(func.count()).where(and_(fk == table.c.id, condition)).scalar_subquery()
+
+    upcoming = count_where(shows.c.start_time > now)
+    past = count_where(shows.c.start_time <= now)
+    values = {column: upcoming for column in COUNT_COLUMNS[(model, 'upcoming')]}
+    values.update({column: past for column in COUNT_COLUMNS[(model, 'past')]})
+
+    # only rows whose counts move, so a run with nothing to do writes nothing
+    # (and leaves updated_at and the table's version alone)
+    statement = update(table).values(**values) \
+        .where(or_(*[table.c[column] != value for column, value in values.items()]))
+    if since is not None:
+        started = select(fk).where(and_(shows.c.start_time > since, shows.c.start_time <= now))
+        statement = statement.where(table.c.id.in_(started))
+    if ids is not None:
+        statement = statement.where(table.c.id.in_(ids))
+    return db.session.execute(statement).rowcount
+
+
+def recount(venue_ids=(), artist_ids=(), now=None):
+    """Recompute the counters of the given venues and artists, without committing.
+
+    For writes that bypass the session (bulk inserts), which the flush listener
+    never sees.
+    """
+    now = now or datetime.now()
+    counted = 0
+    if venue_ids:
+        counted += _recount(Venue, 'venue_id', now, ids=sorted(venue_ids))
+    if artist_ids:
+        counted += _recount(Artist, 'artist_id', now, ids=sorted(artist_ids))
+    return counted
+
+
+def recount_all(now=None):
+    """Recompute every counter from the Show table."""
+    now = now or datetime.now()
+    counted = _recount(Venue, 'venue_id', now) + _recount(Artist, 'artist_id', now)
+    db.session.commit()
+    return counted
+
+
+ROLL_FORWARD = 'show-roll-forward'
+
+
+def rolled_forward_at():
+    return db.session.query(Watermark.at).filter(Watermark.name == ROLL_FORWARD).scalar()
+
+
+def _advance_watermark(name, at):
+    # never moves back, whichever of two overlapping runs commits last
+    insert = pg_insert if db.session.connection().dialect.name == 'postgresql' else sqlite_insert
+    statement = insert(Watermark.__table__).values(name=name, at=at)
+    statement = statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'at': case((Watermark.__table__.c.at > statement.excluded.at, Watermark.__table__.c.at),
+                         else_=statement.excluded.at)})
+    db.session.execute(statement)
+
+
+def roll_forward(window=None, now=None):
+    """Recount the venues and artists with a show that started since the last run.
+
+    `window` looks back a fixed time instead. The first run, with nothing to
+    start from, recounts everything.
+    """
+    now = now or datetime.now()
+    since = now - window if window is not None else rolled_forward_at()
+    rolled = _recount(Venue, 'venue_id', now, since) + _recount(Artist, 'artist_id', now, since)
+    _advance_watermark(ROLL_FORWARD, now)
+    db.session.commit()
+    return rolled
+
+
+def start_roll_forward(app, interval):
+    """Run roll_forward every `interval` seconds on a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    roll_forward()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('show counter roll-forward failed')
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='show-roll-forward', daemon=True)
+    thread.start()
+    return thread
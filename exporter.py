@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from models import db, Venue, Artist, Show
+from genres import names_of
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+# Venues, artists and shows as CSV or JSON lines, produced as a stream of text
+# chunks. Rows come off a server-side cursor (stream_results) a batch at a time
+# (yield_per) and each batch is encoded and handed on before the next is read,
+# so memory stays flat however many rows there are. Venue and artist columns
+# are the import field names, so an export can be imported elsewhere; genres
+# are a list in JSON, ';'-separated in CSV.
+
+KINDS = ('venues', 'artists', 'shows')
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def _entity_columns(model, seeking):
+    return [model.id, model.name, model.city, model.state] + \
+        ([model.address] if model is Venue else []) + \
+        [model.phone, model.genre_mask, model.image_link, model.facebook_link,
+         model.website.label('website_link'), getattr(model, seeking), model.seeking_description,
+         model.upcoming_shows_count, model.past_shows_count]
+
+
+def _statement(kind, since, until, city, state):
+    if kind == 'shows':
+        statement = select(Show.id, Show.start_time,
+                           Show.venue_id, Venue.name.label('venue_name'),
+                           Venue.city.label('venue_city'), Venue.state.label('venue_state'),
+                           Show.artist_id, Artist.name.label('artist_name')) \
+            .join(Venue, Venue.id == Show.venue_id) \
+            .join(Artist, Artist.id == Show.artist_id) \
+            .order_by(Show.start_time, Show.id)
+        if since is not None:
+            statement = statement.where(Show.start_time >= since)
+        if until is not None:
+            statement = statement.where(Show.start_time < until)
+        area = Venue
+    else:
+        model = Venue if kind == 'venues' else Artist
+        seeking = 'seeking_talent' if kind == 'venues' else 'seeking_venue'
+        statement = select(*_entity_columns(model, seeking)).order_by(model.id)
+        area = model
+    if city:
+        statement = statement.where(area.city == city)
+    if state:
+        statement = statement.where(area.state == state)
+    return statement
+
+
+def _fieldnames(statement):
+    return ['genres' if name == 'genre_mask' else name for name in statement.selected_columns.keys()]
+
+
+def _batches(statement, batch_size):
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.mappings().partitions(batch_size):
+        records = []
+        for row in partition:
+            record = dict(row)
+            if 'genre_mask' in record:
+                record['genres'] = names_of(record.pop('genre_mask') or 0)
+            if 'start_time' in record:
+                record['start_time'] = record['start_time'].isoformat(sep=' ')
+            records.append(record)
+        yield records
+
+
+def stream(kind, format, batch_size=1000, since=None, until=None, city=None, state=None):
+    """Yield `kind` as `format` text, one string per batch of `batch_size` rows.
+
+    `since`/`until` bound show start times (until is exclusive); `city` and
+    `state` are the venue's for shows.
+    """
+    statement = _statement(kind, since, until, city, state)
+    fieldnames = _fieldnames(statement)
+    if format == 'csv':
+        out = io.StringIO()
+        csv.DictWriter(out, fieldnames=fieldnames).writeheader()
+        yield out.getvalue()
+    for records in _batches(statement, batch_size):
+        out = io.StringIO()
+        if format == 'jsonl':
+            for record in records:
+                out.write(json.dumps(record))
+                out.write('\n')
+        else:
+            writer = csv.DictWriter(out, fieldnames=fieldnames)
+            for record in records:
+                if 'genres' in record:
+                    record['genres'] = ';'.join(record['genres'])
+                writer.writerow(record)
+        yield out.getvalue()
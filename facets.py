@@ -0,0 +1,152 @@
+from collections import Counter
+from sqlalchemy import event, inspect, case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import db, Venue, Artist, Facet
+from genres import GENRES, bit, lookup, names_of
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+# Venue and artist listings and search can be narrowed by genre, city and state,
+# with the number of venues/artists next to each value. The numbers come from
+# the Facet table, one row per (entity, kind, value):
+#  * every flush that inserts, updates or deletes a venue or artist adjusts the
+#    rows of the values it gained and lost, in the same transaction;
+#  * rebuild() recomputes the table from scratch (`flask facets rebuild`).
+# Counts are over all venues/artists, not just those left by the current filter.
+
+ENTITIES = {Venue: 'venue', Artist: 'artist'}
+KINDS = ('genre', 'city', 'state')
+FACET_COLUMNS = ('city', 'state', 'genre_mask')
+
+
+def facet_values(city, state, genre_mask):
+    values = {('city', city), ('state', state)}
+    values.update(('genre', name) for name in names_of(genre_mask or 0))
+    return values
+
+
+# the old value of a changed column has to be in the attribute history, even
+# when the column was not loaded before being set
+for _model in ENTITIES:
+    for _column in FACET_COLUMNS:
+        event.listen(getattr(_model, _column), 'set', lambda *args: None, active_history=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def count_flushed_facets(session, flush_context, instances):
+    deltas = Counter()
+    for obj in session.new:
+        if type(obj) in ENTITIES:
+            for kind, value in facet_values(obj.city, obj.state, obj.genre_mask):
+                deltas[(ENTITIES[type(obj)], kind, value)] += 1
+    for obj in session.deleted:
+        if type(obj) in ENTITIES and inspect(obj).has_identity:
+            for kind, value in facet_values(obj.city, obj.state, obj.genre_mask):
+                deltas[(ENTITIES[type(obj)], kind, value)] -= 1
+    for obj in session.dirty:
+        if type(obj) not in ENTITIES or obj in session.deleted:
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[column].history.has_changes() for column in FACET_COLUMNS):
+            continue
+        old, new = [], []
+        for column in FACET_COLUMNS:
+            added, unchanged, deleted = attrs[column].history
+            old.append((deleted or unchanged or [None])[0])
+            new.append((added or unchanged or [None])[0])
+        entity = ENTITIES[type(obj)]
+        for kind, value in facet_values(*old) - facet_values(*new):
+            deltas[(entity, kind, value)] -= 1
+        for kind, value in facet_values(*new) - facet_values(*old):
+            deltas[(entity, kind, value)] += 1
+
+    rows = [{'entity': entity, 'kind': kind, 'value': value, 'count': delta}
+            for (entity, kind, value), delta in deltas.items() if delta and value is not None]
+    if rows:
+        _add_counts(session.connection(), rows)
+
+
+def count_rows(model, rows):
+    """Add the facets of inserted `rows` (dicts of column values).
+
+    For writes that bypass the session (bulk inserts), which the flush listener
+    never sees; runs in the current transaction.
+    """
+    deltas = Counter()
+    for row in rows:
+        for kind, value in facet_values(row['city'], row['state'], row.get('genre_mask')):
+            deltas[(ENTITIES[model], kind, value)] += 1
+    if deltas:
+        _add_counts(db.session.connection(), [
+            {'entity': entity, 'kind': kind, 'value': value, 'count': delta}
+            for (entity, kind, value), delta in deltas.items()])
+
+
+def _add_counts(connection, rows):
+    # upsert, so concurrent writers adding to the same value never collide
+    insert = pg_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    statement = insert(Facet.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['entity', 'kind', 'value'],
+        set_={'count': Facet.__table__.c.count + statement.excluded.count})
+    connection.execute(statement, rows)
+
+
+def rebuild():
+    """Recompute every facet count from the Venue and Artist tables."""
+    Facet.query.delete()
+    rows = []
+    for model, entity in ENTITIES.items():
+        for kind in ('city', 'state'):
+            column = getattr(model, kind)
+            rows += [{'entity': entity, 'kind': kind, 'value': value, 'count': count}
+                     for value, count in db.session.query(column, func.count()).group_by(column)]
+        # one pass over the table for all genres
+        genre_counts = db.session.query(*[
+            func.coalesce(func.sum(case((model.genre_mask.op('&')(bit(name)) != 0, 1), else_=0)), 0)
+            for name in GENRES]).one()
+        rows += [{'entity': entity, 'kind': 'genre', 'value': name, 'count': count}
+                 for name, count in zip(GENRES, genre_counts) if count]
+    if rows:
+        db.session.execute(Facet.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def counts(model):
+    """{kind: [(value, count), ...]} for `model`, most common values first."""
+    result = {kind: [] for kind in KINDS}
+    rows = db.session.query(Facet.kind, Facet.value, Facet.count) \
+        .filter(Facet.entity == ENTITIES[model], Facet.count > 0) \
+        .order_by(Facet.kind, Facet.count.desc(), Facet.value)
+    for kind, value, count in rows:
+        result[kind].append((value, count))
+    return result
+
+
+def selected(values):
+    """The facet filters in request `values`, as {kind: [value, ...]}."""
+    chosen = {}
+    genres = [genre for genre in map(lookup, values.getlist('genre')) if genre is not None]
+    if genres:
+        chosen['genre'] = genres
+    for kind in ('city', 'state'):
+        picked = [value for value in values.getlist(kind) if value]
+        if picked:
+            chosen[kind] = picked
+    return chosen
+
+
+def criteria(model, chosen):
+    """Filter criteria for `chosen`: any of the values of a kind, every kind."""
+    conditions = []
+    if 'genre' in chosen:
+        conditions.append(model.with_any_genre(chosen['genre']))
+    for kind in ('city', 'state'):
+        if kind in chosen:
+            conditions.append(getattr(model, kind).in_(chosen[kind]))
+    return conditions
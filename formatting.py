@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+#----------------------------------------------------------------------------#
+# Datetime formatting.
+#----------------------------------------------------------------------------#
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+class DatetimeFormatter:
+    """The `datetime` template filter.
+
+    The locale and every pattern are resolved once, and formatted strings are
+    memoized per (value, format) in a bounded LRU, so a page repeating the same
+    start times formats each of them once. Values that are already datetimes
+    never go through dateutil.
+    """
+
+    def __init__(self, locale='en', cache_size=4096):
+        self.locale = Locale.parse(locale)
+        self.patterns = {}
+        self.format = lru_cache(maxsize=cache_size)(self._format)
+
+    def __call__(self, value, format='medium'):
+        return self.format(value, format)
+
+    def pattern(self, format):
+        pattern = self.patterns.get(format)
+        if pattern is None:
+            pattern = self.patterns[format] = parse_pattern(FORMATS.get(format, format))
+        return pattern
+
+    def _format(self, value, format):
+        # I took this if else statement from the accepted answer of:
+        #    https://stackoverflow.com/questions/63269150/typeerror-parser-must-be-a-string-or-character-stream-not-datetime
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        if isinstance(value, datetime) and value.tzinfo is None:
+            # babel.dates.format_datetime reads naive values as UTC
+            value = value.replace(tzinfo=timezone.utc)
+        return self.pattern(format).apply(value, self.locale)
@@ -0,0 +1,61 @@
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+# The genre dictionary. A genre's id (its row in the Genre table) is its
+# position here plus one, and venues and artists store their genres as a
+# bitmask with bit id - 1 set per genre (Venue.genre_mask, Artist.genre_mask).
+# Ids are baked into stored masks: only ever append to this list, and add the
+# new names to the Genre table in the same migration.
+
+GENRES = [
+    'Alternative',
+    'Blues',
+    'Classical',
+    'Country',
+    'Electronic',
+    'Folk',
+    'Funk',
+    'Hip-Hop',
+    'Heavy Metal',
+    'Instrumental',
+    'Jazz',
+    'Musical Theatre',
+    'Pop',
+    'Punk',
+    'R&B',
+    'Reggae',
+    'Rock n Roll',
+    'Soul',
+    'Other',
+]
+# masks live in a signed BIGINT
+assert len(GENRES) <= 63
+
+GENRE_IDS = {name: i + 1 for i, name in enumerate(GENRES)}
+CHOICES = [(name, name) for name in GENRES]
+_by_lower = {name.lower(): name for name in GENRES}
+
+
+def lookup(term):
+    """The genre named `term`, ignoring case and surrounding space, or None."""
+    return _by_lower.get((term or '').strip().lower())
+
+
+def bit(name):
+    return 1 << (GENRE_IDS[name] - 1)
+
+
+def mask_of(names):
+    """Bitmask of `names`; raises ValueError for a name not in the dictionary."""
+    mask = 0
+    for name in names or ():
+        if name not in GENRE_IDS:
+            raise ValueError('unknown genre: {!r}'.format(name))
+        mask |= bit(name)
+    return mask
+
+
+def names_of(mask):
+    """Genre names set in `mask`, in dictionary order."""
+    return [name for i, name in enumerate(GENRES) if mask >> i & 1]
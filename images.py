@@ -0,0 +1,378 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import mimetypes
+import os
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from flask import g, url_for, send_from_directory, abort
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+from assets import DIST
+
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+#----------------------------------------------------------------------------#
+# Responsive images.
+#----------------------------------------------------------------------------#
+
+# Two sources of images, both rendered through the `picture` macro in
+# templates/macros/images.html as a <picture> with one <source> per modern
+# format and a JPEG srcset fallback:
+#
+# - static images listed in STATIC_IMAGES, resized at build time by
+#   `flask images build` into static/dist/img (content-hashed, served with the
+#   other built assets);
+# - remote Venue/Artist image_links, fetched by a background worker pool the
+#   first time a page shows them and kept on disk in IMAGE_CACHE_DIR. Until the
+#   thumbnails exist the page links the original url and is not page cached.
+#   Only pages rendered while serving a request queue fetches. IMAGE_WORKERS=0
+#   turns this off and pages link the original urls.
+#
+# Everything falls back to the original url when Pillow is not installed.
+
+STATIC_IMAGES = {
+    'img/front-splash.jpg': (480, 960, 1440),
+}
+THUMBNAIL_WIDTHS = (320, 640)
+
+# modern formats first: browsers take the first <source> they support
+FORMATS = [('avif', 'AVIF', {'quality': 50}),
+           ('webp', 'WEBP', {'quality': 75, 'method': 6}),
+           ('jpg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True})]
+# AVIF encodes too slowly to do on request, so thumbnails skip it
+THUMBNAIL_FORMATS = FORMATS[1:]
+MANIFEST = 'manifest.json'
+
+
+class ImageSet:
+    """What the `picture` macro needs: a fallback src and srcsets by type."""
+
+    def __init__(self, src, srcset=None, sources=()):
+        self.src = src
+        self.srcset = srcset
+        self.sources = sources
+
+    @classmethod
+    def from_variants(cls, variants, url):
+        """`variants` maps an extension to [[width, filename], ...]."""
+        def srcset(ext):
+            return ', '.join('{} {}w'.format(url(filename), width) for width, filename in variants[ext])
+        sources = [(mimetypes.types_map['.' + ext], srcset(ext))
+                   for ext, _, _ in FORMATS[:-1] if variants.get(ext)]
+        return cls(url(variants['jpg'][-1][1]), srcset('jpg'), sources)
+
+
+def available_formats(formats):
+    return [f for f in formats if f[0] != 'avif' or features.check('avif')]
+
+
+def write_variants(image, widths, formats, directory, stem, fingerprint=False):
+    """Resize `image` to each width and save it in each format.
+
+    Widths wider than the source are dropped (the source width is used when
+    all of them are). Returns {extension: [[width, filename], ...]}.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    widths = sorted(w for w in widths if w < image.width) or [image.width]
+
+    variants = {}
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, format, options in formats:
+            out = resized.convert('RGB') if format == 'JPEG' else resized
+            buffer = io.BytesIO()
+            out.save(buffer, format, **options)
+            data = buffer.getvalue()
+            if fingerprint:
+                filename = '{}-{}.{}.{}'.format(stem, width, hashlib.sha256(data).hexdigest()[:12], ext)
+            else:
+                filename = '{}-{}.{}'.format(stem, width, ext)
+            path = os.path.join(directory, filename)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+            variants.setdefault(ext, []).append([width, filename])
+    return variants
+
+
+def build(static_folder):
+    """Write the variants of every STATIC_IMAGES entry and return the manifest."""
+    directory = os.path.join(static_folder, DIST, 'img')
+    os.makedirs(directory, exist_ok=True)
+    formats = available_formats(FORMATS)
+    manifest = {}
+    for source, widths in STATIC_IMAGES.items():
+        stem = os.path.splitext(os.path.basename(source))[0]
+        with Image.open(os.path.join(static_folder, source)) as image:
+            variants = write_variants(image, widths, formats, directory, stem, fingerprint=True)
+        manifest[source] = {ext: [[w, 'img/' + name] for w, name in files]
+                            for ext, files in variants.items()}
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+#  Fetching
+#  ----------------------------------------------------------------
+
+# image_links are user input, so a fetch must not reach the app's own network:
+# the host is resolved once, every address it resolves to must be public (or
+# in IMAGE_FETCH_ALLOWED_NETWORKS), and the connection goes to that vetted
+# address rather than resolving the name again. Redirects are followed by hand
+# and each hop is vetted the same way. The body is capped at IMAGE_MAX_BYTES
+# before Pillow sees it.
+
+REDIRECTS = (301, 302, 303, 307, 308)
+USER_AGENT = 'fyyur-thumbnailer'
+
+
+def vetted_address(host, port, allowed_networks=()):
+    """An address to connect to for `host`; ValueError if any it resolves to is not public."""
+    addresses = []
+    for family, type_, proto, canonname, sockaddr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global and not any(address in network for network in allowed_networks):
+            raise ValueError('{} resolves to the non-public address {}'.format(host, address))
+        addresses.append(str(address))
+    if not addresses:
+        raise ValueError('{} does not resolve'.format(host))
+    return addresses[0]
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to `address`, while sending `host` in the Host header."""
+
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class PinnedHTTPSConnection(PinnedHTTPConnection):
+    default_port = http.client.HTTPS_PORT
+
+    def __init__(self, host, port, address, timeout, context=None):
+        super().__init__(host, port, address, timeout)
+        self.context = context or ssl.create_default_context()
+
+    def connect(self):
+        super().connect()
+        # the certificate is checked against the host name, not the address
+        self.sock = self.context.wrap_socket(self.sock, server_hostname=self.host)
+
+
+def fetch(url, timeout, max_bytes, allowed_networks=(), max_redirects=3, context=None):
+    """The body of an image url, see above; ValueError when it may not or cannot be fetched."""
+    deadline = time.monotonic() + timeout
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('not an http(s) url: {}'.format(url))
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        address = vetted_address(parts.hostname, port, allowed_networks)
+        if parts.scheme == 'https':
+            connection = PinnedHTTPSConnection(parts.hostname, port, address, timeout, context)
+        else:
+            connection = PinnedHTTPConnection(parts.hostname, port, address, timeout)
+        try:
+            path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+            connection.request('GET', path, headers={'User-Agent': USER_AGENT, 'Accept': 'image/*'})
+            response = connection.getresponse()
+            if response.status in REDIRECTS and response.getheader('Location'):
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            if response.status != 200:
+                raise ValueError('HTTP {}'.format(response.status))
+            length = response.getheader('Content-Length', '')
+            if length.isdigit() and int(length) > max_bytes:
+                raise ValueError('larger than {} bytes'.format(max_bytes))
+            chunks = []
+            size = 0
+            while True:
+                chunk = response.read(min(65536, max_bytes + 1 - size))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError('larger than {} bytes'.format(max_bytes))
+                if time.monotonic() > deadline:
+                    raise ValueError('took longer than {} seconds'.format(timeout))
+            return b''.join(chunks)
+        finally:
+            connection.close()
+    raise ValueError('more than {} redirects'.format(max_redirects))
+
+
+class Images:
+    def __init__(self, app=None):
+        self.static = {}
+        self.ready = {}
+        self.failed = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config['IMAGE_CACHE_DIR']
+        self.timeout = app.config['IMAGE_FETCH_TIMEOUT']
+        self.max_bytes = app.config['IMAGE_MAX_BYTES']
+        self.max_pixels = app.config['IMAGE_MAX_PIXELS']
+        self.max_redirects = app.config['IMAGE_MAX_REDIRECTS']
+        self.allowed_networks = [ipaddress.ip_network(network.strip())
+                                 for network in app.config['IMAGE_FETCH_ALLOWED_NETWORKS']]
+        self.retry_seconds = app.config['IMAGE_RETRY_SECONDS']
+        self.max_age = app.config['IMAGE_CACHE_MAX_AGE']
+        self.workers = app.config['IMAGE_WORKERS']
+        self.load()
+        app.add_url_rule('/thumbnails/<path:filename>', 'thumbnail', self.serve)
+        app.before_request(self.allow_fetches)
+        app.jinja_env.globals['static_image'] = self.static_image
+        app.jinja_env.globals['thumbnail'] = self.thumbnail
+
+        @app.cli.group('images')
+        def images_command():
+            """Build and warm responsive image variants."""
+
+        @images_command.command('build')
+        def build_command():
+            """Resize and re-encode the static images."""
+            if Image is None:
+                raise SystemExit('Pillow is not installed')
+            self.static = build(app.static_folder)
+            for source, variants in sorted(self.static.items()):
+                print('{}: {}'.format(source, ', '.join(
+                    '{} x{}'.format(ext, len(files)) for ext, files in sorted(variants.items()))))
+
+        @images_command.command('warm')
+        def warm_command():
+            """Fetch thumbnails for every venue and artist image."""
+            if self.workers <= 0:
+                raise SystemExit('thumbnail fetching is off (IMAGE_WORKERS=0)')
+            from models import Venue, Artist
+            urls = {url for model in (Venue, Artist)
+                    for url, in model.query.with_entities(model.image_link) if url}
+            futures = [f for f in map(self.submit, urls) if f is not None]
+            for future in futures:
+                future.result()
+            print('{} images, {} ready, {} failed'.format(len(urls), len(self.ready), len(self.failed)))
+
+    def load(self):
+        path = os.path.join(self.app.static_folder, DIST, 'img', MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.static = json.load(f)
+
+    #  Templates
+    #  ----------------------------------------------------------------
+
+    def static_image(self, source):
+        variants = self.static.get(source)
+        if variants is None:
+            return ImageSet(url_for('static', filename=source))
+        return ImageSet.from_variants(variants, lambda name: url_for('dist_asset', filename=name))
+
+    def allow_fetches(self):
+        # only pages rendered for a request queue fetches, not scripts or
+        # benchmarks that render templates under a test_request_context
+        g.fetch_thumbnails = True
+
+    def thumbnail(self, url):
+        """Thumbnails for a remote image url, queueing them if not yet made."""
+        if not url or Image is None or self.workers <= 0:
+            return ImageSet(url)
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        variants = self.ready.get(key)
+        if variants is None and key not in self.pending and key not in self.failed:
+            variants = self.read_meta(key)
+        if variants is None:
+            if g.get('fetch_thumbnails'):
+                self.submit(url, key)
+            if key in self.pending:
+                # keep the page out of the page cache until the thumbnails exist
+                g.page_cache_nostore = True
+            return ImageSet(url)
+        return ImageSet.from_variants(variants, lambda name: url_for('thumbnail', filename=name))
+
+    #  Worker pool
+    #  ----------------------------------------------------------------
+
+    def read_meta(self, key):
+        try:
+            with open(os.path.join(self.directory, key + '.json')) as f:
+                variants = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.ready[key] = variants
+        return variants
+
+    def submit(self, url, key=None):
+        """Queue `url` for thumbnailing; returns the future, or None if skipped."""
+        key = key or hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        if self.workers <= 0 or urlsplit(url).scheme not in ('http', 'https'):
+            return None
+        with self.lock:
+            if key in self.pending or key in self.ready:
+                return None
+            if time.time() - self.failed.get(key, float('-inf')) < self.retry_seconds:
+                return None
+            if self.executor is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='thumbnails')
+            self.pending.add(key)
+        return self.executor.submit(self.make_thumbnails, url, key)
+
+    def make_thumbnails(self, url, key):
+        try:
+            data = fetch(url, self.timeout, self.max_bytes, self.allowed_networks, self.max_redirects)
+            with Image.open(io.BytesIO(data)) as image:
+                # the header gives the size before anything is decoded
+                if image.width * image.height > self.max_pixels:
+                    raise ValueError('more than {} pixels'.format(self.max_pixels))
+                variants = write_variants(image, THUMBNAIL_WIDTHS, available_formats(THUMBNAIL_FORMATS),
+                                          self.directory, key)
+            meta = os.path.join(self.directory, key + '.json')
+            with open(meta + '.tmp', 'w') as f:
+                json.dump(variants, f)
+            os.replace(meta + '.tmp', meta)
+            self.ready[key] = variants
+        except Exception as e:
+            self.failed[key] = time.time()
+            self.app.logger.warning('thumbnail failed for %s: %s', url, e)
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def serve(self, filename):
+        if filename.endswith('.json'):
+            abort(404)
+        response = send_from_directory(self.directory, filename, max_age=self.max_age)
+        response.headers['Cache-Control'] = 'public, max-age={}'.format(self.max_age)
+        return response
@@ -0,0 +1,228 @@
+import csv
+import json
+import time
+from werkzeug.datastructures import MultiDict
+from models import db, Venue, Artist, Show
+from forms import VenueForm, ArtistForm, ShowForm
+from genres import mask_of
+import counters
+import facets
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Venues, artists and shows are read one row at a time from CSV (a header row
+# naming the form fields) or JSON lines, validated with the same form as the
+# create views, and inserted with one executemany per batch of valid rows,
+# committed per batch. A batch the database rejects is retried row by row so
+# only the offending rows fail. Inserts bypass the session, so each batch
+# updates the show counters and facets itself.
+#
+# Fields are the form fields: genres is a list in JSON, ';'-separated in CSV;
+# booleans accept true/false, yes/no, y/n, 1/0.
+
+FORMATS = ('csv', 'jsonl')
+FALSE_VALUES = ('', '0', 'false', 'no', 'n', 'off')
+
+
+def venue_values(form):
+    return {'name': form.name.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'address': form.address.data,
+            'phone': form.phone.data,
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'website': form.website_link.data,
+            'seeking_talent': form.seeking_talent.data,
+            'seeking_description': form.seeking_description.data,
+            'genre_mask': mask_of(form.genres.data)}
+
+
+def artist_values(form):
+    return {'name': form.name.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'phone': form.phone.data,
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'website': form.website_link.data,
+            'seeking_venue': form.seeking_venue.data,
+            'seeking_description': form.seeking_description.data,
+            'genre_mask': mask_of(form.genres.data)}
+
+
+def show_values(form):
+    values = {}
+    for field in ('venue_id', 'artist_id'):
+        try:
+            values[field] = int(form[field].data)
+        except (TypeError, ValueError):
+            form[field].errors.append('Not a valid id.')
+    if form.start_time.data is None:
+        form.start_time.errors.append('This field is required.')
+    values['start_time'] = form.start_time.data
+    return values
+
+
+KINDS = {
+    'venues': (Venue, VenueForm, venue_values),
+    'artists': (Artist, ArtistForm, artist_values),
+    'shows': (Show, ShowForm, show_values),
+}
+
+
+class ImportReport:
+    def __init__(self, kind, max_errors):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def error(self, line, messages):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': messages})
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'kind': self.kind,
+                'rows': self.rows,
+                'imported': self.imported,
+                'failed': self.failed,
+                'errors': self.errors,
+                'errors_truncated': self.failed > len(self.errors),
+                'seconds': round(self.seconds, 3),
+                'rows_per_second': round(self.rows_per_second, 1)}
+
+    def summary(self):
+        return 'imported {} of {} {} in {:.2f}s ({:.0f} rows/s), {} failed'.format(
+            self.imported, self.rows, self.kind, self.seconds, self.rows_per_second, self.failed)
+
+
+def read_rows(stream, format):
+    """Yield (line number, row dict or None, error) for each record of a text stream."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, 'Not valid JSON: {}'.format(e)
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Not a JSON object.'
+            continue
+        yield line_number, row, None
+
+
+def formdata(row, form_class):
+    data = MultiDict()
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        field_class = getattr(getattr(form_class, key, None), 'field_class', None)
+        field_type = field_class.__name__ if field_class is not None else None
+        if field_type == 'SelectMultipleField':
+            values = value.split(';') if isinstance(value, str) else value
+            for item in values:
+                if str(item).strip():
+                    data.add(key, str(item).strip())
+        elif field_type == 'BooleanField':
+            if str(value).strip().lower() not in FALSE_VALUES:
+                data.add(key, 'y')
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def import_rows(kind, stream, format='csv', batch_size=1000, max_errors=1000):
+    """Validate and insert every row of `stream`; returns an ImportReport."""
+    model, form_class, values_of = KINDS[kind]
+    report = ImportReport(kind, max_errors)
+    batch = []
+    for line, row, error in read_rows(stream, format):
+        report.rows += 1
+        if error is not None:
+            report.error(line, {'row': [error]})
+            continue
+        form = form_class(formdata=formdata(row, form_class), meta={'csrf': False})
+        valid = form.validate()
+        values = values_of(form) if valid else None
+        errors = {field: messages for field, messages in form.errors.items() if messages}
+        if errors:
+            report.error(line, errors)
+            continue
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            _load(model, batch, report)
+            batch = []
+    if batch:
+        _load(model, batch, report)
+    report.seconds = time.perf_counter() - report.started
+    return report
+
+
+def _load(model, batch, report):
+    if model is Show:
+        batch = _existing_references(batch, report)
+    try:
+        _insert(model, [values for line, values in batch])
+        db.session.commit()
+        report.imported += len(batch)
+        return
+    except Exception:
+        db.session.rollback()
+    # find the rows the database refused, keeping the rest
+    for line, values in batch:
+        try:
+            with db.session.begin_nested():
+                _insert(model, [values])
+            report.imported += 1
+        except Exception as e:
+            report.error(line, {'row': [str(getattr(e, 'orig', e)).strip()]})
+    db.session.commit()
+
+
+def _insert(model, rows):
+    if not rows:
+        return
+    db.session.execute(model.__table__.insert(), rows)
+    if model is Show:
+        counters.recount(venue_ids={row['venue_id'] for row in rows},
+                         artist_ids={row['artist_id'] for row in rows})
+    else:
+        facets.count_rows(model, rows)
+
+
+def _existing_references(batch, report):
+    # one query per side instead of a foreign key failure per row
+    kept = []
+    venue_ids = {values['venue_id'] for line, values in batch}
+    artist_ids = {values['artist_id'] for line, values in batch}
+    venues = {row.id for row in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    artists = {row.id for row in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    for line, values in batch:
+        errors = {}
+        if values['venue_id'] not in venues:
+            errors['venue_id'] = ['No venue with this id.']
+        if values['artist_id'] not in artists:
+            errors['artist_id'] = ['No artist with this id.']
+        if errors:
+            report.error(line, errors)
+        else:
+            kept.append((line, values))
+    return kept
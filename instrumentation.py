@@ -0,0 +1,102 @@
+import re
+import time
+from collections import Counter
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# SQL instrumentation.
+#----------------------------------------------------------------------------#
+
+# Every statement executed while a request is being handled is counted and
+# timed, and its "shape" (the statement with literals and IN lists collapsed) is
+# tallied. A shape repeated SQL_NPLUSONE_THRESHOLD times in one request is
+# flagged as a likely N+1. Totals go out in the Server-Timing header, and a
+# warning is logged when a view goes over its statement budget
+# (SQL_BUDGETS[endpoint], else SQL_BUDGET_DEFAULT). A budget of None skips
+# both checks, for views that repeat statements by design.
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r'\bIN\s*\((?:[^()]*)\)', re.IGNORECASE)
+_spaces = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    shape = _literals.sub('?', statement)
+    shape = _in_lists.sub('IN (...)', shape)
+    return _spaces.sub(' ', shape).strip()
+
+
+class RequestSQLStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold):
+        return [(shape, times) for shape, times in self.shapes.most_common() if times >= threshold]
+
+
+def current_stats():
+    """The SQL stats of the request being handled, or None outside one."""
+    if not has_app_context():
+        return None
+    return g.get('sql_stats')
+
+
+class SQLInstrumentation:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        # listening on the Engine class covers every engine the app creates
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._fyyur_started = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = current_stats()
+        if stats is None:
+            return
+        started = getattr(context, '_fyyur_started', None)
+        if started is not None:
+            stats.duration += time.perf_counter() - started
+        stats.count += 1
+        stats.shapes[statement_shape(statement)] += 1
+
+    def start_request(self):
+        g.sql_stats = RequestSQLStats()
+
+    def finish_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        g.sql_stats_done = stats
+        config = self.app.config
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.duration * 1000
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(db_ms, stats.count))
+        response.headers.add('Server-Timing', 'app;dur={:.2f}'.format(total_ms))
+
+        endpoint = request.endpoint or 'unmatched'
+        budget = config['SQL_BUDGETS'].get(endpoint, config['SQL_BUDGET_DEFAULT'])
+        if budget is None:
+            return response
+        repeated = stats.repeated(config['SQL_NPLUSONE_THRESHOLD'])
+        if repeated:
+            shape, times = repeated[0]
+            self.app.logger.warning('likely N+1 in %s %s: %d executions of %s',
+                                    request.method, request.path, times, shape)
+        if stats.count > budget:
+            self.app.logger.warning('%s %s issued %d SQL statements (%.1f ms), over its budget of %d',
+                                    request.method, request.path, stats.count, db_ms, budget)
+        return response
@@ -0,0 +1,123 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import time
+from logging import Formatter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from flask import g, request
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+# Request threads never touch the disk: log records are put on a bounded
+# in-memory queue and a background listener thread writes them out to rotating
+# files. If the queue is full (the disk cannot keep up) records are dropped and
+# counted rather than blocking the request; the count is exported as the
+# log_records_dropped gauge and written to the log at shutdown.
+
+ACCESS_LOGGER = 'fyyur.access'
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggerFilter(logging.Filter):
+    # route records by logger name: `accept` selects the access log records
+    def __init__(self, name, accept):
+        super().__init__()
+        self.logger_name = name
+        self.accept = accept
+
+    def filter(self, record):
+        return (record.name == self.logger_name) == self.accept
+
+
+def rotating_handler(path, config):
+    if config['LOG_ROTATE_WHEN']:
+        return TimedRotatingFileHandler(path, when=config['LOG_ROTATE_WHEN'],
+                                        backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+    return RotatingFileHandler(path, maxBytes=config['LOG_MAX_BYTES'],
+                               backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+
+
+def setup_logging(app):
+    config = app.config
+    log_queue = queue.Queue(maxsize=config['LOG_QUEUE_SIZE'])
+
+    file_handler = rotating_handler(config['LOG_FILE'], config)
+    file_handler.setFormatter(
+        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    )
+    file_handler.setLevel(logging.INFO)
+    file_handler.addFilter(LoggerFilter(ACCESS_LOGGER, accept=False))
+    handlers = [file_handler]
+
+    if config['ACCESS_LOG_SAMPLE_RATE'] > 0:
+        access_handler = rotating_handler(config['ACCESS_LOG_FILE'], config)
+        access_handler.setFormatter(Formatter('%(message)s'))
+        access_handler.addFilter(LoggerFilter(ACCESS_LOGGER, accept=True))
+        handlers.append(access_handler)
+        access_logger = logging.getLogger(ACCESS_LOGGER)
+        access_logger.setLevel(logging.INFO)
+        access_logger.propagate = False
+        install_access_log(app, access_logger, config['ACCESS_LOG_SAMPLE_RATE'])
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    running = [True]
+
+    @atexit.register
+    def flush_logs():
+        # drains what is still queued, then reports the drops straight to the
+        # file now that nothing else writes to it
+        if not running[0]:
+            return
+        running[0] = False
+        listener.stop()
+        if queue_handler.dropped:
+            file_handler.handle(app.logger.makeRecord(
+                app.logger.name, logging.WARNING, __file__, 0,
+                '%d log records dropped because the log queue was full', (queue_handler.dropped,), None))
+
+    app.logger.setLevel(logging.INFO)
+    app.logger.addHandler(queue_handler)
+    if config['ACCESS_LOG_SAMPLE_RATE'] > 0:
+        logging.getLogger(ACCESS_LOGGER).addHandler(queue_handler)
+    return queue_handler
+
+
+def install_access_log(app, logger, sample_rate):
+    # one JSON line per sampled request
+    @app.before_request
+    def start_access_log():
+        g.access_log_started = time.perf_counter()
+
+    @app.after_request
+    def write_access_log(response):
+        started = g.get('access_log_started')
+        if started is None or random.random() >= sample_rate:
+            return response
+        sql_stats = g.get('sql_stats')
+        logger.info(json.dumps({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'method': request.method,
+            'path': request.path,
+            'route': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'sql_count': sql_stats.count if sql_stats is not None else None,
+        }))
+        return response
@@ -0,0 +1,225 @@
+import threading
+import time
+from flask import g, request, Response, abort
+from flask.signals import before_render_template, template_rendered, signals_available
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+# Per endpoint histograms of request latency, template render time, database time
+# and response size, plus page cache hits and misses and any gauges registered
+# with gauge(), served in the Prometheus text format at /metrics.
+#
+# Recording takes no lock: every thread writes to its own shard, and only a
+# scrape walks the shards and adds them up. Shards of threads that have exited
+# are folded into one retired shard whenever a new thread registers its shard,
+# and on scrape, so memory stays bounded by the number of live threads times the
+# number of endpoints even under a thread-per-request server that is never
+# scraped.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = (
+    ('request_duration_seconds', 'Time spent handling the request.', LATENCY_BUCKETS),
+    ('render_duration_seconds', 'Time spent rendering templates.', LATENCY_BUCKETS),
+    ('db_duration_seconds', 'Time spent executing SQL statements.', LATENCY_BUCKETS),
+    ('response_size_bytes', 'Size of the response body.', SIZE_BUCKETS),
+)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+
+class EndpointStats:
+    __slots__ = ('histograms', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets) for name, help, buckets in HISTOGRAMS}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+
+
+class Metrics:
+    def __init__(self, app=None, prefix='fyyur_'):
+        self.prefix = prefix
+        self.local = threading.local()
+        self.shards = []
+        self.retired = {}
+        self.gauges = []
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        if signals_available:
+            before_render_template.connect(self.start_render, app)
+            template_rendered.connect(self.finish_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.retire()
+                self.shards.append((threading.current_thread(), shard))
+        return shard
+
+    def retire(self):
+        # call with the lock held; an exited thread writes nothing more to its shard
+        live = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for endpoint, stats in shard.items():
+                    self.retired.setdefault(endpoint, EndpointStats()).merge(stats)
+        self.shards = live
+
+    def endpoint_stats(self, endpoint):
+        shard = self.shard()
+        stats = shard.get(endpoint)
+        if stats is None:
+            stats = shard[endpoint] = EndpointStats()
+        return stats
+
+    def gauge(self, name, help, read, label=None):
+        """Export read() on every scrape: a number, or {label value: number} when `label` is set."""
+        self.gauges.append((name, help, read, label))
+
+    # request hooks
+
+    def start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.render_time = 0.0
+
+    def start_render(self, sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def finish_render(self, sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None:
+            g.render_time = g.get('render_time', 0.0) + time.perf_counter() - started
+
+    def finish_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        # only registered endpoints get their own series, which keeps them bounded
+        stats = self.endpoint_stats(request.endpoint or 'unmatched')
+        histograms = stats.histograms
+        histograms['request_duration_seconds'].observe(time.perf_counter() - started)
+        histograms['render_duration_seconds'].observe(g.get('render_time', 0.0))
+        sql_stats = g.get('sql_stats')
+        if sql_stats is not None:
+            histograms['db_duration_seconds'].observe(sql_stats.duration)
+        size = response.content_length
+        if size is None and not response.is_streamed:
+            size = len(response.get_data())
+        if size is not None:
+            histograms['response_size_bytes'].observe(size)
+        page_cache = g.get('page_cache')
+        if page_cache == 'hit':
+            stats.cache_hits += 1
+        elif page_cache == 'miss':
+            stats.cache_misses += 1
+        return response
+
+    # exposition
+
+    def collect(self):
+        totals = {}
+        with self.lock:
+            self.retire()
+            for thread, shard in self.shards:
+                for endpoint, stats in list(shard.items()):
+                    totals.setdefault(endpoint, EndpointStats()).merge(stats)
+            for endpoint, stats in self.retired.items():
+                totals.setdefault(endpoint, EndpointStats()).merge(stats)
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, help, buckets in HISTOGRAMS:
+            metric = self.prefix + name
+            lines.append('# HELP {} {}'.format(metric, help))
+            lines.append('# TYPE {} histogram'.format(metric))
+            for endpoint in sorted(totals):
+                histogram = totals[endpoint].histograms[name]
+                cumulative = 0
+                for bound, count in zip(buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{{endpoint="{}",le="{}"}} {}'.format(metric, endpoint, bound, cumulative))
+                lines.append('{}_bucket{{endpoint="{}",le="+Inf"}} {}'.format(metric, endpoint, histogram.count))
+                lines.append('{}_sum{{endpoint="{}"}} {}'.format(metric, endpoint, round(histogram.sum, 6)))
+                lines.append('{}_count{{endpoint="{}"}} {}'.format(metric, endpoint, histogram.count))
+
+        metric = self.prefix + 'page_cache_requests_total'
+        lines.append('# HELP {} Cacheable page requests by cache result.'.format(metric))
+        lines.append('# TYPE {} counter'.format(metric))
+        for endpoint in sorted(totals):
+            stats = totals[endpoint]
+            if stats.cache_hits or stats.cache_misses:
+                lines.append('{}{{endpoint="{}",result="hit"}} {}'.format(metric, endpoint, stats.cache_hits))
+                lines.append('{}{{endpoint="{}",result="miss"}} {}'.format(metric, endpoint, stats.cache_misses))
+
+        metric = self.prefix + 'page_cache_hit_ratio'
+        lines.append('# HELP {} Share of cacheable page requests served from the cache.'.format(metric))
+        lines.append('# TYPE {} gauge'.format(metric))
+        for endpoint in sorted(totals):
+            stats = totals[endpoint]
+            requests = stats.cache_hits + stats.cache_misses
+            if requests:
+                lines.append('{}{{endpoint="{}"}} {}'.format(metric, endpoint, round(stats.cache_hits / requests, 4)))
+
+        for name, help, read, label in self.gauges:
+            metric = self.prefix + name
+            lines.append('# HELP {} {}'.format(metric, help))
+            lines.append('# TYPE {} gauge'.format(metric))
+            value = read()
+            if label is None:
+                if value is not None:
+                    lines.append('{} {}'.format(metric, value))
+            else:
+                for key in sorted(value):
+                    lines.append('{}{{{}="{}"}} {}'.format(metric, label, key, value[key]))
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        # metrics are for the local scraper only
+        if request.remote_addr not in self.app.config['METRICS_ALLOWED_ADDRESSES']:
+            abort(404)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,30 @@
+"""trigram search indexes
+
+Revision ID: 9c4e2a7f1b3d
+Revises: 6730d7fa00ba
+Create Date: 2026-10-18 09:12:41.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e2a7f1b3d'
+down_revision = '6730d7fa00ba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute('CREATE INDEX "ix_{0}_name_trgm" ON "{0}" USING gin (name gin_trgm_ops)'.format(table))
+        op.execute('CREATE INDEX "ix_{0}_area_trgm" ON "{0}" USING gin '
+                   '((city || \', \' || state) gin_trgm_ops)'.format(table))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.execute('DROP INDEX IF EXISTS "ix_{0}_area_trgm"'.format(table))
+        op.execute('DROP INDEX IF EXISTS "ix_{0}_name_trgm"'.format(table))
@@ -0,0 +1,34 @@
+"""updated_at row versions
+
+Revision ID: a4c7e2f9b1d6
+Revises: e8a1c4f7b2d9
+Create Date: 2026-10-18 18:32:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e2f9b1d6'
+down_revision = 'e8a1c4f7b2d9'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    for table in TABLES:
+        # now() is stable, so existing rows get the migration time without a
+        # table rewrite; the app sets the column itself from then on
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,28 @@
+"""job watermarks
+
+Revision ID: b6e2d9f4c8a1
+Revises: a4c7e2f9b1d6
+Create Date: 2026-10-18 19:10:22.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2d9f4c8a1'
+down_revision = 'a4c7e2f9b1d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Watermark',
+    sa.Column('name', sa.String(length=63), nullable=False),
+    sa.Column('at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('Watermark')
@@ -0,0 +1,35 @@
+"""backfill show counters
+
+Revision ID: b7d3e5a1c2f0
+Revises: 9c4e2a7f1b3d
+Create Date: 2026-10-18 10:03:17.552904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e5a1c2f0'
+down_revision = '9c4e2a7f1b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the counter columns existed before anything maintained them
+    op.execute('''
+        UPDATE "Venue" SET
+            upcoming_shows_count = (SELECT count(*) FROM "Show" s WHERE s.venue_id = "Venue".id AND s.start_time > now()),
+            num_upcoming_shows = (SELECT count(*) FROM "Show" s WHERE s.venue_id = "Venue".id AND s.start_time > now()),
+            past_shows_count = (SELECT count(*) FROM "Show" s WHERE s.venue_id = "Venue".id AND s.start_time <= now())
+    ''')
+    op.execute('''
+        UPDATE "Artist" SET
+            upcoming_shows_count = (SELECT count(*) FROM "Show" s WHERE s.artist_id = "Artist".id AND s.start_time > now()),
+            past_shows_count = (SELECT count(*) FROM "Show" s WHERE s.artist_id = "Artist".id AND s.start_time <= now())
+    ''')
+
+
+def downgrade():
+    pass
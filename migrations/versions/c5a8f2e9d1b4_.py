@@ -0,0 +1,40 @@
+"""indexes for the hot query predicates
+
+Revision ID: c5a8f2e9d1b4
+Revises: b7d3e5a1c2f0
+Create Date: 2026-10-18 11:20:05.318774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8f2e9d1b4'
+down_revision = 'b7d3e5a1c2f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # detail pages: a venue's / an artist's shows split around now()
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+    # /shows keyset pagination
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'])
+    # /venues area directory and /artists keyset pagination
+    op.create_index('ix_Venue_city_state_name', 'Venue', ['city', 'state', 'name', 'id'])
+    op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'])
+    # genre membership (genres @> ARRAY[...], genre = ANY(genres))
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Venue_city_state_name', table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,88 @@
+"""genre dictionary and genre bitmasks
+
+Revision ID: d2f6b8a4e1c7
+Revises: c5a8f2e9d1b4
+Create Date: 2026-10-18 16:58:41.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f6b8a4e1c7'
+down_revision = 'c5a8f2e9d1b4'
+branch_labels = None
+depends_on = None
+
+# frozen copy of genres.GENRES as of this revision
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other']
+BATCH_SIZE = 5000
+
+
+def backfill(table, statement):
+    # one committed UPDATE per id range, so no batch holds row locks on the
+    # whole table for the length of the migration
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM "{}"'.format(table))).scalar()
+    with op.get_context().autocommit_block():
+        for low in range(0, max_id, BATCH_SIZE):
+            bind.execute(sa.text(statement), {'low': low, 'high': low + BATCH_SIZE})
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(genre, [{'id': i + 1, 'name': name} for i, name in enumerate(GENRES)])
+
+    # refuse to drop genre names the dictionary cannot hold
+    unknown = op.get_bind().execute(sa.text('''
+        SELECT DISTINCT g FROM (
+            SELECT unnest(genres) AS g FROM "Venue"
+            UNION ALL SELECT unnest(genres) FROM "Artist"
+        ) used
+        WHERE g NOT IN (SELECT name FROM "Genre")
+    ''')).scalars().all()
+    if unknown:
+        raise RuntimeError('genres missing from the dictionary: {}; add them to genres.GENRES '
+                           'and to this migration, or fix the rows'.format(', '.join(sorted(unknown))))
+
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('genre_mask', sa.BigInteger(), server_default='0', nullable=False))
+    for table in ('Venue', 'Artist'):
+        backfill(table, '''
+            UPDATE "{0}" SET genre_mask = (
+                SELECT coalesce(bit_or(1::bigint << (g.id - 1)), 0) FROM "Genre" g
+                WHERE g.name = ANY("{0}".genres))
+            WHERE id > :low AND id <= :high
+        '''.format(table))
+
+    op.drop_index('ix_Venue_genres', table_name='Venue')
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_column('Venue', 'genres')
+    op.drop_column('Artist', 'genres')
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True))
+    for table in ('Venue', 'Artist'):
+        backfill(table, '''
+            UPDATE "{0}" SET genres = ARRAY(
+                SELECT g.name FROM "Genre" g
+                WHERE "{0}".genre_mask & (1::bigint << (g.id - 1)) != 0
+                ORDER BY g.id)
+            WHERE id > :low AND id <= :high
+        '''.format(table))
+    for table in ('Venue', 'Artist'):
+        op.alter_column(table, 'genres', existing_type=postgresql.ARRAY(sa.String()), nullable=False)
+        op.create_index('ix_{}_genres'.format(table), table, ['genres'], postgresql_using='gin')
+        op.drop_column(table, 'genre_mask')
+    op.drop_table('Genre')
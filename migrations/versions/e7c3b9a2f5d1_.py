@@ -0,0 +1,46 @@
+"""table version counters
+
+Revision ID: e7c3b9a2f5d1
+Revises: b6e2d9f4c8a1
+Create Date: 2026-10-18 21:48:05.207316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3b9a2f5d1'
+down_revision = 'b6e2d9f4c8a1'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    table_version = op.create_table('TableVersion',
+    sa.Column('name', sa.String(length=63), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_version, [{'name': table, 'version': 0} for table in TABLES])
+    # one bump per statement, however many rows it touches
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE "TableVersion" SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in TABLES:
+        op.execute('CREATE TRIGGER "{0}_version" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{0}" '
+                   'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()'.format(table))
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute('DROP TRIGGER IF EXISTS "{0}_version" ON "{0}"'.format(table))
+    op.execute('DROP FUNCTION IF EXISTS bump_table_version()')
+    op.drop_table('TableVersion')
@@ -0,0 +1,43 @@
+"""facet counts
+
+Revision ID: e8a1c4f7b2d9
+Revises: d2f6b8a4e1c7
+Create Date: 2026-10-18 17:21:05.839126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a1c4f7b2d9'
+down_revision = 'd2f6b8a4e1c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Facet',
+    sa.Column('entity', sa.String(length=10), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('value', sa.String(length=120), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('entity', 'kind', 'value')
+    )
+    # same counts as facets.rebuild()
+    for table, entity in (('Venue', 'venue'), ('Artist', 'artist')):
+        for column in ('city', 'state'):
+            op.execute('''
+                INSERT INTO "Facet" (entity, kind, value, count)
+                SELECT '{1}', '{2}', {2}, count(*) FROM "{0}" GROUP BY {2}
+            '''.format(table, entity, column))
+        op.execute('''
+            INSERT INTO "Facet" (entity, kind, value, count)
+            SELECT '{1}', 'genre', g.name, count(*) FROM "{0}" t
+            JOIN "Genre" g ON t.genre_mask & (1::bigint << (g.id - 1)) != 0
+            GROUP BY g.name
+        '''.format(table, entity))
+
+
+def downgrade():
+    op.drop_table('Facet')
@@ -0,0 +1,84 @@
+"""table version slots, no bump for statements that change nothing
+
+Revision ID: f4d2a7c9e3b8
+Revises: e7c3b9a2f5d1
+Create Date: 2026-10-18 23:05:41.730962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d2a7c9e3b8'
+down_revision = 'e7c3b9a2f5d1'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+SLOTS = 16
+# a trigger with a transition table can only have one event
+OPERATIONS = (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'), ('TRUNCATE', None))
+
+
+def upgrade():
+    for table in TABLES:
+        op.execute('DROP TRIGGER IF EXISTS "{0}_version" ON "{0}"'.format(table))
+    # each table's counter is spread over SLOTS rows, one per connection, so
+    # concurrent writers do not queue behind one row lock; its version is the sum
+    op.add_column('TableVersion', sa.Column('slot', sa.Integer(), nullable=False, server_default='0'))
+    op.alter_column('TableVersion', 'slot', server_default=None)
+    op.drop_constraint('TableVersion_pkey', 'TableVersion', type_='primary')
+    op.create_primary_key('TableVersion_pkey', 'TableVersion', ['name', 'slot'])
+    table_version = sa.table('TableVersion',
+                             sa.column('name', sa.String),
+                             sa.column('slot', sa.Integer),
+                             sa.column('version', sa.BigInteger))
+    op.bulk_insert(table_version, [{'name': table, 'slot': slot, 'version': 0}
+                                   for table in TABLES for slot in range(1, SLOTS)])
+    # one bump per statement, and none for statements that touched no rows
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'TRUNCATE' THEN
+                IF NOT EXISTS (SELECT 1 FROM changed) THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            UPDATE "TableVersion" SET version = version + 1
+                WHERE name = TG_TABLE_NAME AND slot = pg_backend_pid() % {0};
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    '''.format(SLOTS))
+    for table in TABLES:
+        for operation, changed in OPERATIONS:
+            referencing = 'REFERENCING {} TABLE AS changed '.format(changed) if changed else ''
+            op.execute('CREATE TRIGGER "{0}_version_{1}" AFTER {2} ON "{0}" {3}'
+                       'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()'
+                       .format(table, operation.lower(), operation, referencing))
+
+
+def downgrade():
+    for table in TABLES:
+        for operation, changed in OPERATIONS:
+            op.execute('DROP TRIGGER IF EXISTS "{0}_version_{1}" ON "{0}"'.format(table, operation.lower()))
+    # fold the slots back into one row per table, never moving a version back
+    op.execute('UPDATE "TableVersion" SET version = totals.version FROM '
+               '(SELECT name, sum(version) AS version FROM "TableVersion" GROUP BY name) AS totals '
+               'WHERE "TableVersion".name = totals.name AND "TableVersion".slot = 0')
+    op.execute('DELETE FROM "TableVersion" WHERE slot <> 0')
+    op.drop_constraint('TableVersion_pkey', 'TableVersion', type_='primary')
+    op.drop_column('TableVersion', 'slot')
+    op.create_primary_key('TableVersion_pkey', 'TableVersion', ['name'])
+    op.execute('''
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE "TableVersion" SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in TABLES:
+        op.execute('CREATE TRIGGER "{0}_version" AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{0}" '
+                   'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()'.format(table))
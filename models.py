@@ -1,22 +1,67 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from sqlalchemy import event
+from routing import RoutingSQLAlchemy
+from genres import mask_of, names_of
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+    # ids are fixed by genres.GENRES, see there
+    id = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<id: {self.id}, name: {self.name}>'
+
+class GenreMembership:
+    """Genres kept as a bitmask of Genre ids, see genres.py."""
+    genre_mask = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+    @property
+    def genres(self):
+        return names_of(self.genre_mask or 0)
+
+    @genres.setter
+    def genres(self, names):
+        self.genre_mask = mask_of(names)
+
+    @classmethod
+    def with_any_genre(cls, names):
+        """Filter criterion: at least one of `names`."""
+        return cls.genre_mask.op('&')(mask_of(names)) != 0
+
+    @classmethod
+    def with_all_genres(cls, names):
+        """Filter criterion: every one of `names`."""
+        mask = mask_of(names)
+        return cls.genre_mask.op('&')(mask) == mask
+
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # row version for the API's ETags, in UTC; bumped by every ORM or Core update
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<id: {self.id}, venue_id: {self.venue_id}, artist_id: {self.artist_id}>'
     
-class Venue(db.Model):
+class Venue(GenreMembership, db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_city_state_name', 'city', 'state', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -32,14 +77,17 @@ class Venue(db.Model):
     past_shows_count = db.Column(db.Integer, nullable=False, default=0)
     upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
     num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     shows = db.relationship('Show', backref='venue', lazy=True, cascade="all, delete")
 
     def __repr__(self):
         return f'<id: {self.id}, name: {self.name}>'
 
-class Artist(db.Model):
+class Artist(GenreMembership, db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -53,8 +101,93 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(500), nullable=True)
     past_shows_count = db.Column(db.Integer, nullable=False, default=0)
     upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     shows = db.relationship('Show', backref='artist', lazy=True, cascade="all, delete")
 
     def __repr__(self):
-        return f'<id: {self.id}, name: {self.name}>'
\ No newline at end of file
+        return f'<id: {self.id}, name: {self.name}>'
+
+class Facet(db.Model):
+    __tablename__ = 'Facet'
+    # one row per (entity, kind, value), maintained by facets.py
+    entity = db.Column(db.String(10), primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)
+    value = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<{self.entity} {self.kind}: {self.value} ({self.count})>'
+
+class Watermark(db.Model):
+    __tablename__ = 'Watermark'
+    # how far each background job has got, e.g. counters.roll_forward
+    name = db.Column(db.String(63), primary_key=True)
+    at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<{self.name} at {self.at}>'
+
+class TableVersion(db.Model):
+    __tablename__ = 'TableVersion'
+    # a counter per table in VERSIONED_TABLES, bumped by a trigger on every
+    # write that changes rows of it, so api.py can tell whether a table changed
+    # by reading a handful of rows instead of scanning it. Each table's counter
+    # is split over VERSION_SLOTS rows, one per connection, so that concurrent
+    # writers do not all queue behind the same row lock; its version is the sum
+    name = db.Column(db.String(63), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<{self.name}[{self.slot}] version {self.version}>'
+
+VERSIONED_TABLES = ('Venue', 'Artist', 'Show')
+VERSION_SLOTS = 16
+
+# the same triggers as migration f4d2a7c9e3b8, for databases made by create_all()
+def version_triggers(dialect):
+    if dialect == 'postgresql':
+        # one bump per statement, however many rows it touches, and none for a
+        # statement that touched no rows (a statement level trigger fires for
+        # those too, e.g. an UPDATE from counters.roll_forward with nothing to
+        # roll forward); TRUNCATE has no transition table to look at
+        yield '''
+            CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP <> 'TRUNCATE' THEN
+                    IF NOT EXISTS (SELECT 1 FROM changed) THEN
+                        RETURN NULL;
+                    END IF;
+                END IF;
+                UPDATE "TableVersion" SET version = version + 1
+                    WHERE name = TG_TABLE_NAME AND slot = pg_backend_pid() % {0};
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        '''.format(VERSION_SLOTS)
+        for table in VERSIONED_TABLES:
+            # a trigger with a transition table can only have one event
+            for operation, changed in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'), ('TRUNCATE', None)):
+                referencing = 'REFERENCING {} TABLE AS changed '.format(changed) if changed else ''
+                yield 'DROP TRIGGER IF EXISTS "{0}_version_{1}" ON "{0}"'.format(table, operation.lower())
+                yield ('CREATE TRIGGER "{0}_version_{1}" AFTER {2} ON "{0}" {3}'
+                       'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()'
+                       .format(table, operation.lower(), operation, referencing))
+    elif dialect == 'sqlite':
+        # SQLite only has row level triggers, which do not fire for statements
+        # that touch no rows, and one writer at a time, so slot 0 will do
+        for table in VERSIONED_TABLES:
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                yield ('CREATE TRIGGER IF NOT EXISTS "{0}_version_{1}" AFTER {2} ON "{0}" BEGIN '
+                       'UPDATE "TableVersion" SET version = version + 1 WHERE name = \'{0}\' AND slot = 0; END'
+                       .format(table, operation.lower(), operation))
+
+@event.listens_for(TableVersion.__table__, 'after_create')
+def seed_table_versions(target, connection, **kw):
+    connection.execute(target.insert(), [{'name': name, 'slot': slot, 'version': 0}
+                                         for name in VERSIONED_TABLES for slot in range(VERSION_SLOTS)])
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def create_version_triggers(target, connection, **kw):
+    for statement in version_triggers(connection.dialect.name):
+        connection.exec_driver_sql(statement)
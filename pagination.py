@@ -0,0 +1,104 @@
+import base64
+import json
+from datetime import datetime
+from flask import request, current_app, abort
+from sqlalchemy import tuple_
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# Pages are addressed by the sort key of the row they start after (or end before)
+# rather than by an OFFSET, so every page costs one index range scan no matter
+# how deep into the listing it is. The key travels in the url as an opaque token,
+# and a token is only accepted if it decodes to values of the listing's key
+# types (ARTIST_KEY, SHOW_KEY), so a forged one cannot reach the query.
+
+# the types of the sort keys that page_cursors() checks cursors against
+ARTIST_KEY = (str, int)
+SHOW_KEY = (datetime, int)
+
+def encode_cursor(values):
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value
+               for value in values]
+    token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token, types):
+    # returns None for anything that was not produced by encode_cursor from a
+    # key of `types`
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, list) or len(payload) != len(types):
+            return None
+        values = tuple(datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+                       for value in payload)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+    # bool is an int to isinstance, but never a key value
+    if any(isinstance(value, bool) or not isinstance(value, type_) for value, type_ in zip(values, types)):
+        return None
+    return values
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_page(query, columns, key, per_page, after=None, before=None):
+    """Fetch one page of `query` ordered by `columns`.
+
+    `key` maps a result row to its values for `columns`; `after`/`before` are
+    decoded cursors. One extra row is fetched to find out whether another page
+    exists in the direction of travel.
+    """
+    if before is not None:
+        rows = query.filter(tuple_(*columns) < tuple_(*before)) \
+            .order_by(*[column.desc() for column in columns]) \
+            .limit(per_page + 1) \
+            .all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        next_cursor = encode_cursor(key(rows[-1])) if rows else encode_cursor(before)
+        prev_cursor = encode_cursor(key(rows[0])) if has_more else None
+        return Page(rows, next_cursor, prev_cursor)
+
+    if after is not None:
+        query = query.filter(tuple_(*columns) > tuple_(*after))
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(key(rows[-1])) if has_more else None
+    if after is None:
+        prev_cursor = None
+    else:
+        prev_cursor = encode_cursor(key(rows[0])) if rows else encode_cursor(after)
+    return Page(rows, next_cursor, prev_cursor)
+
+
+def page_size(default):
+    # ?per_page= may shrink or grow a page, but never past MAX_PER_PAGE
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, current_app.config['MAX_PER_PAGE']))
+
+
+def page_cursors(types):
+    """The ?after= and ?before= cursors of the request, decoded as keys of `types`; 400 if either is invalid."""
+    after = request.args.get('after')
+    before = request.args.get('before')
+    after = decode_cursor(after, types) if after else None
+    before = decode_cursor(before, types) if before else None
+    if (request.args.get('after') and after is None) or (request.args.get('before') and before is None):
+        abort(400)
+    return after, before
@@ -0,0 +1,92 @@
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# Statements run by GET/HEAD requests go to a replica; everything else (write
+# views, CLI commands, background jobs, flushes and any session holding pending
+# changes) goes to the primary. A request that commits marks the browser session
+# so that requests in the next READ_YOUR_WRITES_SECONDS (i.e. the page it is
+# redirected to) also read from the primary and see their own write.
+#
+# Reads that must not lag behind the primary (say, a page about to be cached)
+# run inside `with read_primary():`, or in a view decorated with
+# @reads_primary.
+#
+# Replicas are listed in SQLALCHEMY_REPLICA_URIS and registered as the binds
+# replica_0, replica_1, ...; each request sticks to one of them.
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = '_read_primary_until'
+
+
+@contextmanager
+def read_primary():
+    """Send the reads of the current request inside the block to the primary."""
+    previous = g.get('read_primary', False)
+    g.read_primary = True
+    try:
+        yield
+    finally:
+        g.read_primary = previous
+
+
+def reads_primary(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with read_primary():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.replica_bind(clause)
+        if replica is not None:
+            return get_state(self.app).db.get_engine(self.app, bind=replica)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def replica_bind(self, clause):
+        replicas = self.app.config.get('SQLALCHEMY_REPLICA_BINDS')
+        if not replicas or not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if self._flushing or self.new or self.dirty or self.deleted or isinstance(clause, UpdateBase):
+            return None
+        if g.get('read_primary') or session.get(STICKY_KEY, 0) > time.time():
+            return None
+        if 'replica_bind' not in g:
+            g.replica_bind = random.choice(replicas)
+        return g.replica_bind
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        replicas = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for i, uri in enumerate(replicas):
+            binds['replica_{}'.format(i)] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds or None
+        app.config['SQLALCHEMY_REPLICA_BINDS'] = ['replica_{}'.format(i) for i in range(len(replicas))]
+        super().init_app(app)
+
+        @event.listens_for(self.session, 'after_commit')
+        def remember_write(db_session):
+            if has_request_context():
+                g.wrote_to_primary = True
+
+        @app.after_request
+        def stick_to_primary(response):
+            if g.get('wrote_to_primary') and app.config['SQLALCHEMY_REPLICA_BINDS']:
+                session[STICKY_KEY] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+            return response
@@ -0,0 +1,203 @@
+import re
+import threading
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import or_, case, literal
+from models import db, Show
+from genres import lookup, bit
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venue and artist search matches the term against the name, the "city, state"
+# area and the genres, and ranks hits by trigram similarity. On PostgreSQL this
+# runs on pg_trgm and the GIN indexes from migration 9c4e2a7f1b3d; on any other
+# database (SQLite in tests) an in-process trigram index gives the same results.
+# A page of results is a list of SearchHit tuples, with the upcoming show count
+# of every hit from one grouped query over the page's ids.
+
+SIMILARITY_THRESHOLD = 0.3
+
+
+def trigrams(text):
+    # same decomposition as pg_trgm: lower-cased alphanumeric words, each padded
+    # with two spaces in front and one behind
+    grams = set()
+    for word in re.findall(r'[^\W_]+', (text or '').lower()):
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def area_of(model):
+    return model.city + ', ' + model.state
+
+
+class NgramIndex:
+    """Trigram posting lists over the searchable fields of one model."""
+
+    def __init__(self, rows):
+        self.entries = {}
+        self.postings = {}
+        for row in rows:
+            name_grams = trigrams(row.name)
+            area_grams = trigrams('{}, {}'.format(row.city, row.state))
+            self.entries[row.id] = (row.name.lower(), name_grams, area_grams, row.genre_mask)
+            for gram in name_grams | area_grams:
+                self.postings.setdefault(gram, set()).add(row.id)
+
+    def search(self, term):
+        """Return [(score, id)] for every entry matching `term`, best first."""
+        term_grams = trigrams(term)
+        needle = term.strip().lower()
+        genre = lookup(term)
+        genre_bit = bit(genre) if genre is not None else 0
+
+        candidates = set()
+        for gram in term_grams:
+            candidates |= self.postings.get(gram, set())
+        # substring matches: every name containing the term also contains the
+        # unpadded trigrams of its words, so intersect those posting lists, and
+        # only scan everything when the term is too short to have any
+        inner_grams = {word[i:i + 3] for word in re.findall(r'[^\W_]+', needle)
+                       for i in range(len(word) - 2)}
+        if inner_grams:
+            candidates |= set.intersection(*[self.postings.get(gram, set()) for gram in inner_grams])
+        else:
+            candidates |= set(self.entries)
+        if genre is not None:
+            candidates |= {entry_id for entry_id, entry in self.entries.items() if entry[3] & genre_bit}
+
+        hits = []
+        for entry_id in candidates:
+            name, name_grams, area_grams, genre_mask = self.entries[entry_id]
+            score = max(similarity(term_grams, name_grams), similarity(term_grams, area_grams))
+            if genre_mask & genre_bit:
+                score = max(score, 1.0)
+            if score >= SIMILARITY_THRESHOLD or needle in name or genre_mask & genre_bit:
+                hits.append((score, name, entry_id))
+        hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+        return [(score, entry_id) for score, name, entry_id in hits]
+
+
+SearchHit = namedtuple('SearchHit', 'id name city state num_upcoming_shows')
+
+
+def upcoming_counts(model, ids, now=None):
+    """{id: number of upcoming shows} for the `model` rows with `ids`, in one query."""
+    if not ids:
+        return {}
+    show_fk = getattr(Show, model.__name__.lower() + '_id')
+    now = now or datetime.now()
+    # a range scan of the (fk, start_time) index per id
+    return dict(db.session.query(show_fk, db.func.count())
+                .filter(show_fk.in_(ids), Show.start_time > now)
+                .group_by(show_fk))
+
+
+def _hits(model, rows):
+    counts = upcoming_counts(model, [row.id for row in rows])
+    return [SearchHit(row.id, row.name, row.city, row.state, counts.get(row.id, 0)) for row in rows]
+
+
+class SearchResults:
+    def __init__(self, count, data, page, per_page):
+        self.count = count
+        self.data = data
+        self.page = page
+        self.per_page = per_page
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page * self.per_page < self.count
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def invalidate(model):
+    # called by the write views; the in-process index is rebuilt on next search
+    _indexes.pop(model.__name__, None)
+
+
+def _ngram_index(model):
+    index = _indexes.get(model.__name__)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(model.__name__)
+            if index is None:
+                rows = db.session.query(model.id, model.name, model.city, model.state, model.genre_mask)
+                index = NgramIndex(rows)
+                _indexes[model.__name__] = index
+    return index
+
+
+def _columns(model):
+    return (model.id, model.name, model.city, model.state)
+
+
+def search(model, term, page=1, per_page=10, max_results=200, filters=()):
+    """One page of ranked `model` rows matching `term` and every one of `filters`.
+
+    `count` is capped at `max_results`, and so is how deep one can page.
+    """
+    page = max(1, page)
+    offset = (page - 1) * per_page
+    limit = max(0, min(per_page, max_results - offset))
+
+    if db.engine.dialect.name == 'postgresql':
+        return _search_pg(model, term, page, per_page, offset, limit, max_results, filters)
+
+    hits = _ngram_index(model).search(term)
+    if filters:
+        kept = {row.id for row in db.session.query(model.id).filter(*filters)}
+        hits = [hit for hit in hits if hit[1] in kept]
+    hits = hits[:max_results]
+    page_ids = [entry_id for score, entry_id in hits[offset:offset + limit]]
+    rows = {row.id: row for row in
+            db.session.query(*_columns(model)).filter(model.id.in_(page_ids))} if page_ids else {}
+    return SearchResults(len(hits), _hits(model, [rows[entry_id] for entry_id in page_ids if entry_id in rows]),
+                         page, per_page)
+
+
+def _search_pg(model, term, page, per_page, offset, limit, max_results, filters):
+    pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+    area = area_of(model)
+    genre = lookup(term)
+
+    score = db.func.greatest(db.func.similarity(model.name, term), db.func.similarity(area, term))
+    matches = [model.name.ilike(pattern, escape='\\'), model.name.op('%')(term), area.op('%')(term)]
+    if genre is not None:
+        score = case((model.with_any_genre([genre]), literal(1.0)), else_=score)
+        matches.append(model.with_any_genre([genre]))
+    score = score.label('score')
+
+    ranked = db.session.query(*_columns(model), score) \
+        .filter(or_(*matches), *filters) \
+        .order_by(score.desc(), model.name, model.id) \
+        .limit(max_results) \
+        .subquery()
+    rows = db.session.query(ranked.c.id, ranked.c.name, ranked.c.city, ranked.c.state,
+                            db.func.count().over().label('total')) \
+        .select_from(ranked) \
+        .order_by(ranked.c.score.desc(), ranked.c.name, ranked.c.id) \
+        .offset(offset) \
+        .limit(limit) \
+        .all()
+    if rows:
+        count = rows[0].total
+    else:
+        count = db.session.query(db.func.count()).select_from(ranked).scalar()
+    return SearchResults(count, _hits(model, rows), page, per_page)
@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Search-as-you-type: fills a search box's <datalist> from the url in its
+// data-autocomplete attribute, dropping answers to anything but the latest input.
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var latest = 0;
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      var term = input.value.trim();
+      var request = ++latest;
+      if (!term) {
+        list.innerHTML = '';
+        return;
+      }
+      timer = setTimeout(function () {
+        fetch(input.getAttribute('data-autocomplete') + '&q=' + encodeURIComponent(term))
+          .then(function (response) { return response.json(); })
+          .then(function (body) {
+            if (request !== latest) return;
+            list.innerHTML = '';
+            body.results.forEach(function (result) {
+              var option = document.createElement('option');
+              option.value = result.name;
+              list.appendChild(option);
+            });
+          })
+          .catch(function () {});
+      }, 80);
+    });
+  });
+});
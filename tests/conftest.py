@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['FYYUR_ENV'] = 'test'
+# keep the app's log files out of the checkout
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'fyyur-test-error.log'))
+os.environ.setdefault('ACCESS_LOG_FILE', os.path.join(tempfile.gettempdir(), 'fyyur-test-access.log'))
+
+
+@pytest.fixture
+def app():
+    """The application on a fresh in-memory database.
+
+    No app context is held while the test runs, so each test client request
+    gets its own g; tests push one around their own queries.
+    """
+    from app import app
+    from models import db
+    import search
+    app.config.update(WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    search._indexes.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.http import parse_date
+
+import counters
+from models import db, Venue, Artist, Show, TableVersion
+
+
+@pytest.fixture
+def booked(app):
+    with app.app_context():
+        venue = Venue(name='Hall', city='Austin', state='TX', address='1 Main St', seeking_talent=False)
+        artist = Artist(name='Band', city='Austin', state='TX', seeking_venue=False)
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        now = datetime.now()
+        db.session.add_all([Show(venue_id=venue.id, artist_id=artist.id, start_time=now - timedelta(days=1)),
+                            Show(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=1))])
+        db.session.commit()
+    return app
+
+
+def etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.headers['ETag']
+
+
+def test_writes_change_the_collection_etag(booked, client):
+    before = etag(client, '/api/v1/venues')
+    with booked.app_context():
+        db.session.add(Venue(name='Club', city='Austin', state='TX', address='2 Main St', seeking_talent=False))
+        db.session.commit()
+    assert etag(client, '/api/v1/venues') != before
+
+
+def test_statements_that_change_nothing_keep_the_etag(booked, client):
+    with booked.app_context():
+        counters.roll_forward()
+    before = [etag(client, url) for url in ('/api/v1/venues', '/api/v1/artists', '/api/v1/shows')]
+    with booked.app_context():
+        # nothing has started since the last run, and the counts are right
+        assert counters.roll_forward() == 0
+        assert counters.recount_all() == 0
+        Venue.query.filter(Venue.id == -1).update({'name': 'Nowhere'})
+        db.session.commit()
+    assert [etag(client, url) for url in ('/api/v1/venues', '/api/v1/artists', '/api/v1/shows')] == before
+
+
+def test_table_versions_sum_their_slots(booked, client):
+    before = etag(client, '/api/v1/artists')
+    with booked.app_context():
+        TableVersion.query.filter_by(name='Artist', slot=5).update({'version': TableVersion.version + 1})
+        db.session.commit()
+    assert etag(client, '/api/v1/artists') != before
+
+
+def ids(app):
+    with app.app_context():
+        return Venue.query.one().id, Artist.query.one().id
+
+
+def test_a_matching_if_none_match_is_a_304(booked, client):
+    venue_id, artist_id = ids(booked)
+    for url in ('/api/v1/venues', '/api/v1/artists', '/api/v1/shows',
+                '/api/v1/venues/{}'.format(venue_id), '/api/v1/artists/{}'.format(artist_id)):
+        tag = etag(client, url)
+        response = client.get(url, headers={'If-None-Match': tag})
+        assert response.status_code == 304 and response.data == b''
+        assert response.headers['ETag'] == tag
+        assert client.get(url, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_an_edit_makes_the_old_etag_a_200(booked, client):
+    venue_id, artist_id = ids(booked)
+    url = '/api/v1/venues/{}'.format(venue_id)
+    tag = etag(client, url)
+    with booked.app_context():
+        db.session.get(Artist, artist_id).name = 'Renamed'
+        db.session.commit()
+    response = client.get(url, headers={'If-None-Match': tag})
+    assert response.status_code == 200
+    assert response.get_json()['data']['past_shows'][0]['artist_name'] == 'Renamed'
+
+
+def test_if_modified_since_on_a_single_resource(booked, client):
+    venue_id, artist_id = ids(booked)
+    url = '/api/v1/artists/{}'.format(artist_id)
+    response = client.get(url)
+    assert response.last_modified is not None
+    since = {'If-Modified-Since': response.headers['Last-Modified']}
+    assert client.get(url, headers=since).status_code == 304
+    # collections have no Last-Modified, so If-Modified-Since alone never 304s
+    assert 'Last-Modified' not in client.get('/api/v1/artists').headers
+    assert client.get('/api/v1/artists', headers=since).status_code == 200
+
+
+def test_a_show_starting_is_a_modification(booked, client):
+    venue_id, artist_id = ids(booked)
+    hour_ago = datetime.utcnow() - timedelta(hours=1)
+    with booked.app_context():
+        for model in (Venue, Artist, Show):
+            db.session.execute(model.__table__.update().values(updated_at=hour_ago))
+        db.session.commit()
+    url = '/api/v1/venues/{}'.format(venue_id)
+    response = client.get(url)
+    assert len(response.get_json()['data']['upcoming_shows']) == 1
+    since = {'If-Modified-Since': response.headers['Last-Modified']}
+
+    # time passes: the upcoming show starts, and no row is written
+    shows = Show.__table__
+    with booked.app_context():
+        db.session.execute(shows.update()
+                           .where(shows.c.start_time > datetime.now())
+                           .values(start_time=datetime.now() - timedelta(minutes=1), updated_at=shows.c.updated_at))
+        db.session.commit()
+    response = client.get(url, headers=since)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['past_shows']) == 2
+    assert response.last_modified > parse_date(since['If-Modified-Since'])
+
+
+def test_fields_pick_the_items_fields(booked, client):
+    venues = client.get('/api/v1/venues?fields=name,city').get_json()['data']
+    assert venues == [{'name': 'Hall', 'city': 'Austin'}]
+    shows = client.get('/api/v1/shows?fields=artist_name,venue_name').get_json()['data']
+    assert shows == [{'artist_name': 'Band', 'venue_name': 'Hall'}] * 2
+
+
+def test_show_lists_only_when_asked_for(booked, client):
+    venue_id, artist_id = ids(booked)
+    url = '/api/v1/artists/{}'.format(artist_id)
+    assert client.get(url + '?fields=name').get_json() == {'data': {'name': 'Band'}}
+    data = client.get(url + '?fields=upcoming_shows,name').get_json()['data']
+    assert list(data) == ['upcoming_shows', 'name']
+    assert [show['venue_name'] for show in data['upcoming_shows']] == ['Hall']
+    full = client.get(url).get_json()['data']
+    assert len(full['past_shows']) == 1 and full['past_shows_count'] == 1
+
+
+@pytest.mark.parametrize('url', ['/api/v1/venues?fields=name,password',
+                                 '/api/v1/shows?fields=,',
+                                 '/api/v1/artists/1?fields=shows'])
+def test_unknown_fields_are_a_400(booked, client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 400
+
+
+def test_missing_resources_are_a_json_404(booked, client):
+    response = client.get('/api/v1/venues/999')
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'Not Found'
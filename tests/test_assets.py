@@ -0,0 +1,33 @@
+import pytest
+from flask import Flask
+
+from assets import Assets, DIST
+
+
+@pytest.fixture
+def client(tmp_path):
+    dist = tmp_path / 'static' / DIST
+    dist.mkdir(parents=True)
+    (dist / 'main.abc123.css').write_text('body{}')
+    (dist / 'main.abc123.css.gz').write_bytes(b'gzip')
+    (dist / 'main.abc123.css.br').write_bytes(b'brotli')
+    app = Flask(__name__, static_folder=str(tmp_path / 'static'))
+    Assets(app)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('accept, encoding, body', [
+    ('gzip, br', 'br', b'brotli'),
+    ('gzip', 'gzip', b'gzip'),
+    ('br;q=0, gzip', 'gzip', b'gzip'),
+    ('br;q=0, gzip;q=0', None, b'body{}'),
+    ('*, br;q=0', 'gzip', b'gzip'),
+    ('identity', None, b'body{}'),
+])
+def test_precompressed_files_follow_accept_encoding(client, accept, encoding, body):
+    response = client.get('/static/dist/main.abc123.css', headers={'Accept-Encoding': accept})
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == encoding
+    assert response.data == body
+    assert 'Accept-Encoding' in response.headers['Vary']
+    response.close()
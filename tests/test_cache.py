@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+from flask import Flask, g
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache import LocalBackend, PageCache
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    app.page_cache = PageCache(LocalBackend())
+    app.renders = []
+    return app
+
+
+def route(app, path, tags, during_render=None):
+    @app.route(path, endpoint=path)
+    @app.page_cache.cached(tags=lambda: tags)
+    def view():
+        app.renders.append(g.get('read_primary'))
+        if during_render is not None:
+            during_render()
+        return 'page {}'.format(len(app.renders))
+
+
+def test_miss_renders_from_the_primary_and_is_stored(app):
+    route(app, '/venues', ['venue-list'])
+    client = app.test_client()
+    assert client.get('/venues').get_data(as_text=True) == 'page 1'
+    assert client.get('/venues').get_data(as_text=True) == 'page 1'
+    assert app.renders == [True]
+
+
+def test_invalidate_drops_the_page(app):
+    route(app, '/venues', ['venue-list'])
+    client = app.test_client()
+    client.get('/venues')
+    app.page_cache.invalidate('venue-list')
+    assert client.get('/venues').get_data(as_text=True) == 'page 2'
+
+
+def test_page_invalidated_while_rendering_is_not_stored(app):
+    # a write commits and invalidates between the page's reads and its store
+    route(app, '/venues', ['venue-list'], during_render=lambda: app.page_cache.invalidate('venue-list'))
+    client = app.test_client()
+    client.get('/venues')
+    client.get('/venues')
+    assert len(app.renders) == 2
+
+
+def test_page_rendered_across_a_clear_is_not_stored(app):
+    route(app, '/venues', ['venue-list'], during_render=app.page_cache.clear)
+    client = app.test_client()
+    client.get('/venues')
+    client.get('/venues')
+    assert len(app.renders) == 2
+
+
+def test_other_tags_do_not_block_the_store(app):
+    route(app, '/venues', ['venue-list'], during_render=lambda: app.page_cache.invalidate('artist-list'))
+    client = app.test_client()
+    client.get('/venues')
+    client.get('/venues')
+    assert len(app.renders) == 1
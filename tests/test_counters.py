@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import counters
+from models import db, Venue, Artist, Show
+
+NOW = datetime.now()
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def booked(app):
+    """Two venues and an artist, with one past and one upcoming show at the first venue."""
+    with app.app_context():
+        venues = [Venue(name=name, city='Austin', state='TX', address='1 Main St', seeking_talent=False)
+                  for name in ('Hall', 'Club')]
+        artist = Artist(name='Band', city='Austin', state='TX', seeking_venue=False)
+        db.session.add_all(venues + [artist])
+        db.session.flush()
+        db.session.add_all([Show(venue_id=venues[0].id, artist_id=artist.id, start_time=NOW - 24 * HOUR),
+                            Show(venue_id=venues[0].id, artist_id=artist.id, start_time=NOW + 24 * HOUR)])
+        db.session.commit()
+    return app
+
+
+def counts():
+    """{name: (past, upcoming)} of every venue and artist, as stored on the rows."""
+    result = {}
+    for venue in Venue.query:
+        assert venue.num_upcoming_shows == venue.upcoming_shows_count
+        result[venue.name] = (venue.past_shows_count, venue.upcoming_shows_count)
+    for artist in Artist.query:
+        result[artist.name] = (artist.past_shows_count, artist.upcoming_shows_count)
+    return result
+
+
+def show(start_after):
+    return Show.query.filter(Show.start_time > NOW + start_after).order_by(Show.start_time).first()
+
+
+def test_creating_shows_counts_them(booked):
+    with booked.app_context():
+        assert counts() == {'Hall': (1, 1), 'Club': (0, 0), 'Band': (1, 1)}
+
+
+def test_moving_a_show_moves_its_count(booked):
+    with booked.app_context():
+        club = Venue.query.filter_by(name='Club').one()
+        show(HOUR * 0).venue_id = club.id
+        db.session.commit()
+        assert counts() == {'Hall': (1, 0), 'Club': (0, 1), 'Band': (1, 1)}
+
+        # rescheduled into the past, without the columns having been loaded
+        db.session.expire_all()
+        show(HOUR * 0).start_time = NOW - 2 * HOUR
+        db.session.commit()
+        assert counts() == {'Hall': (1, 0), 'Club': (1, 0), 'Band': (2, 0)}
+
+        # and back, through the relationship
+        moved = show(-3 * HOUR)
+        moved.venue = Venue.query.filter_by(name='Hall').one()
+        moved.start_time = NOW + HOUR
+        db.session.commit()
+        assert counts() == {'Hall': (1, 1), 'Club': (0, 0), 'Band': (1, 1)}
+
+
+def test_deleting_a_show_uncounts_it(booked):
+    with booked.app_context():
+        db.session.delete(show(HOUR * 0))
+        db.session.commit()
+        assert counts() == {'Hall': (1, 0), 'Club': (0, 0), 'Band': (1, 0)}
+
+
+def test_deleting_a_venue_uncounts_its_shows(booked, client):
+    with booked.app_context():
+        hall = Venue.query.filter_by(name='Hall').one().id
+    client.delete('/venues/{}'.format(hall))
+    with booked.app_context():
+        assert counts() == {'Club': (0, 0), 'Band': (0, 0)}
+
+
+def test_roll_forward_moves_started_shows_to_past(booked):
+    with booked.app_context():
+        assert counters.roll_forward(now=NOW) == 0
+        # a day on, the upcoming show has started
+        assert counters.roll_forward(now=NOW + 25 * HOUR) == 2
+        assert counts() == {'Hall': (2, 0), 'Club': (0, 0), 'Band': (2, 0)}
+        assert counters.rolled_forward_at() == NOW + 25 * HOUR
+        # nothing started since: nothing to write
+        assert counters.roll_forward(now=NOW + 26 * HOUR) == 0
+
+
+def test_a_late_roll_forward_catches_up(booked):
+    with booked.app_context():
+        counters.roll_forward(now=NOW - 48 * HOUR)
+        # down for three days: the watermark still covers the whole gap
+        assert counters.roll_forward(now=NOW + 48 * HOUR) == 2
+        assert counts() == {'Hall': (2, 0), 'Club': (0, 0), 'Band': (2, 0)}
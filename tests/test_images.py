@@ -0,0 +1,157 @@
+import io
+import ipaddress
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from images import Images, fetch, vetted_address
+
+Image = pytest.importorskip('PIL.Image')
+
+LOOPBACK = [ipaddress.ip_network('127.0.0.0/8')]
+
+
+def png(width=800, height=600):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class StubImageServer(BaseHTTPRequestHandler):
+    routes = {
+        '/image.png': (200, {'Content-Type': 'image/png'}, png()),
+        '/huge.png': (200, {'Content-Type': 'image/png'}, png(2000, 2000)),
+        '/big': (200, {'Content-Type': 'image/png'}, b'\0' * 4096),
+        '/to-image': (302, {'Location': '/image.png'}, b''),
+        '/to-metadata': (302, {'Location': 'http://169.254.169.254/latest/meta-data/'}, b''),
+        '/loop': (302, {'Location': '/loop'}, b''),
+    }
+
+    def do_GET(self):
+        if self.path == '/big-unsized':
+            # no Content-Length: the cap has to hold while reading
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.end_headers()
+            self.wfile.write(b'\0' * 4096)
+            return
+        status, headers, body = self.routes.get(self.path, (404, {}, b''))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubImageServer)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_app(tmp_path, **config):
+    app = Flask(__name__, static_folder=str(tmp_path / 'static'))
+    app.config.update(IMAGE_CACHE_DIR=str(tmp_path / 'thumbnails'), IMAGE_WORKERS=1, IMAGE_FETCH_TIMEOUT=5,
+                      IMAGE_MAX_BYTES=1024 * 1024, IMAGE_MAX_PIXELS=10 * 1000 * 1000, IMAGE_MAX_REDIRECTS=3,
+                      IMAGE_FETCH_ALLOWED_NETWORKS=['127.0.0.0/8'], IMAGE_RETRY_SECONDS=3600,
+                      IMAGE_CACHE_MAX_AGE=60)
+    app.config.update(config)
+    return app, Images(app)
+
+
+@pytest.mark.parametrize('host', ['127.0.0.1', '10.0.0.1', '192.168.1.1', '169.254.169.254', '::1', '::ffff:127.0.0.1'])
+def test_non_public_addresses_are_rejected(host):
+    with pytest.raises(ValueError, match='non-public'):
+        vetted_address(host, 80)
+
+
+def test_public_address_is_allowed():
+    assert vetted_address('93.184.216.34', 80) == '93.184.216.34'
+
+
+def test_loopback_is_rejected_unless_allowed(server):
+    with pytest.raises(ValueError, match='non-public'):
+        fetch(server + '/image.png', 5, 1024 * 1024)
+    assert fetch(server + '/image.png', 5, 1024 * 1024, LOOPBACK) == png()
+
+
+def test_redirects_are_followed_and_vetted(server):
+    assert fetch(server + '/to-image', 5, 1024 * 1024, LOOPBACK) == png()
+    with pytest.raises(ValueError, match='169.254.169.254'):
+        fetch(server + '/to-metadata', 5, 1024 * 1024, LOOPBACK)
+    with pytest.raises(ValueError, match='redirects'):
+        fetch(server + '/loop', 5, 1024 * 1024, LOOPBACK)
+
+
+@pytest.mark.parametrize('path', ['/big', '/big-unsized'])
+def test_bodies_over_the_cap_are_rejected(server, path):
+    with pytest.raises(ValueError, match='larger than 1000 bytes'):
+        fetch(server + path, 5, 1000, LOOPBACK)
+
+
+def test_thumbnails_are_made_from_the_stub_server(server, tmp_path):
+    app, images = make_app(tmp_path)
+    url = server + '/image.png'
+    images.submit(url).result()
+    images.shutdown()
+    with app.test_request_context():
+        image_set = images.thumbnail(url)
+    assert image_set.src.startswith('/thumbnails/')
+    assert os.listdir(tmp_path / 'thumbnails')
+
+
+def test_failed_fetches_are_not_retried_right_away(server, tmp_path):
+    app, images = make_app(tmp_path, IMAGE_FETCH_ALLOWED_NETWORKS=[])
+    url = server + '/image.png'
+    images.submit(url).result()
+    assert images.submit(url) is None
+    images.shutdown()
+    assert not images.ready
+
+
+def test_images_over_the_pixel_cap_are_rejected(server, tmp_path):
+    app, images = make_app(tmp_path, IMAGE_MAX_PIXELS=1000 * 1000)
+    images.submit(server + '/huge.png').result()
+    images.shutdown()
+    assert not images.ready and images.failed
+
+
+def test_zero_workers_turns_fetching_off(server, tmp_path):
+    app, images = make_app(tmp_path, IMAGE_WORKERS=0)
+    url = server + '/image.png'
+    with app.test_request_context():
+        assert images.thumbnail(url).src == url
+    assert images.submit(url) is None
+    assert images.executor is None
+
+
+def test_only_requests_queue_fetches(server, tmp_path):
+    app, images = make_app(tmp_path)
+    url = server + '/image.png'
+
+    @app.route('/page')
+    def page():
+        return images.thumbnail(url).src
+
+    # a template rendered outside a request (a script, a benchmark) queues nothing
+    with app.test_request_context():
+        assert images.thumbnail(url).src == url
+    assert images.executor is None and not images.pending
+
+    app.test_client().get('/page')
+    images.shutdown()
+    assert images.ready
@@ -0,0 +1,41 @@
+import threading
+
+from flask import Flask
+
+from metrics import Metrics
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['METRICS_ALLOWED_ADDRESSES'] = ['127.0.0.1']
+    metrics = Metrics(app)
+
+    @app.route('/page')
+    def page():
+        return 'ok'
+
+    return app, metrics
+
+
+def test_shards_of_exited_threads_are_folded_without_a_scrape():
+    app, metrics = make_app()
+    client = app.test_client()
+    # one thread per request, like a threaded server with no scraper
+    for _ in range(50):
+        thread = threading.Thread(target=client.get, args=('/page',))
+        thread.start()
+        thread.join()
+    assert len(metrics.shards) <= 1
+    assert metrics.collect()['page'].histograms['request_duration_seconds'].count == 50
+    assert not metrics.shards
+
+
+def test_scrapes_add_up_live_and_retired_shards():
+    app, metrics = make_app()
+    client = app.test_client()
+    thread = threading.Thread(target=client.get, args=('/page',))
+    thread.start()
+    thread.join()
+    client.get('/page')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'fyyur_request_duration_seconds_count{endpoint="page"} 2' in body
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Venue, Artist, Show
+from pagination import encode_cursor, decode_cursor, ARTIST_KEY, SHOW_KEY
+
+
+@pytest.fixture
+def listed(app):
+    with app.app_context():
+        venue = Venue(name='Hall', city='Austin', state='TX', address='1 Main St', seeking_talent=False)
+        artists = [Artist(name='Artist {}'.format(i), city='Austin', state='TX', seeking_venue=False)
+                   for i in range(5)]
+        db.session.add_all([venue] + artists)
+        db.session.flush()
+        now = datetime.now()
+        db.session.add_all([Show(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=i))
+                            for i, artist in enumerate(artists)])
+        db.session.commit()
+    return app
+
+
+def test_cursor_round_trip():
+    key = (datetime(2026, 1, 2, 20, 30), 7)
+    assert decode_cursor(encode_cursor(key), SHOW_KEY) == key
+    assert decode_cursor(encode_cursor(('Band', 3)), ARTIST_KEY) == ('Band', 3)
+
+
+@pytest.mark.parametrize('values, types', [
+    ([1], ARTIST_KEY),
+    (['Band', 3, 4], ARTIST_KEY),
+    ([3, 'Band'], ARTIST_KEY),
+    (['Band', True], ARTIST_KEY),
+    (['Band', None], ARTIST_KEY),
+    (['2026-01-02', 7], SHOW_KEY),
+    ([{'dt': '2026-01-02'}], SHOW_KEY),
+])
+def test_cursors_of_the_wrong_shape_are_rejected(values, types):
+    assert decode_cursor(encode_cursor(values), types) is None
+
+
+def test_tokens_that_are_not_cursors_are_rejected():
+    for token in ('not-a-cursor', encode_cursor([]).replace('W', '!'), 'eyJkdCI6IjIwMjYifQ'):  # {"dt":"2026"}
+        assert decode_cursor(token, SHOW_KEY) is None
+
+
+@pytest.mark.parametrize('url', ['/artists?after=WzFd',  # [1]: wrong length
+                                 '/artists?before=not-a-cursor',
+                                 '/shows?after=' + encode_cursor(['Band', 3]),  # wrong types
+                                 '/api/v1/artists?after=WzFd',
+                                 '/api/v1/shows?before=WyJ4Il0'])
+def test_bad_cursors_are_a_400(listed, client, url):
+    assert client.get(url).status_code == 400
+
+
+def test_pages_follow_their_cursors(listed, client):
+    first = client.get('/api/v1/artists?per_page=2').get_json()
+    assert [item['name'] for item in first['data']] == ['Artist 0', 'Artist 1']
+    second = client.get(first['links']['next']).get_json()
+    assert [item['name'] for item in second['data']] == ['Artist 2', 'Artist 3']
+    back = client.get(second['links']['prev']).get_json()
+    assert back['data'] == first['data']
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from routing import RoutingSQLAlchemy, read_primary, reads_primary
+
+# The "replica" is a second SQLite file that nothing replicates to, so a read
+# that returns a freshly written row can only have gone to the primary.
+
+
+@pytest.fixture
+def app(tmp_path):
+    primary = 'sqlite:///' + str(tmp_path / 'primary.db')
+    replica = 'sqlite:///' + str(tmp_path / 'replica.db')
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', SQLALCHEMY_DATABASE_URI=primary, SQLALCHEMY_REPLICA_URIS=[replica],
+                      SQLALCHEMY_TRACK_MODIFICATIONS=False, READ_YOUR_WRITES_SECONDS=60)
+    db = RoutingSQLAlchemy()
+
+    class Item(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(40), nullable=False)
+
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    engine = create_engine(replica)
+    db.Model.metadata.create_all(engine)
+    engine.dispose()
+
+    def names():
+        return jsonify(sorted(item.name for item in Item.query))
+
+    @app.route('/items')
+    def items():
+        return names()
+
+    @app.route('/items/fresh')
+    @reads_primary
+    def fresh_items():
+        return names()
+
+    @app.route('/items/block')
+    def block_items():
+        with read_primary():
+            inside = sorted(item.name for item in Item.query)
+        outside = sorted(item.name for item in Item.query)
+        return jsonify(inside=inside, outside=outside)
+
+    @app.route('/items', methods=['POST'])
+    def create_item():
+        db.session.add(Item(name='written'))
+        db.session.commit()
+        return '', 201
+
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in (db.get_engine(app), db.get_engine(app, bind='replica_0')):
+            engine.dispose()
+
+
+def test_writer_reads_its_own_write_from_the_primary(app):
+    writer = app.test_client()
+    assert writer.post('/items').status_code == 201
+    assert writer.get('/items').get_json() == ['written']
+
+
+def test_other_clients_read_from_the_replica(app):
+    app.test_client().post('/items')
+    assert app.test_client().get('/items').get_json() == []
+
+
+def test_stickiness_expires(app):
+    app.config['READ_YOUR_WRITES_SECONDS'] = 0
+    writer = app.test_client()
+    writer.post('/items')
+    assert writer.get('/items').get_json() == []
+
+
+def test_reads_primary_decorator(app):
+    app.test_client().post('/items')
+    assert app.test_client().get('/items/fresh').get_json() == ['written']
+
+
+def test_read_primary_block(app):
+    app.test_client().post('/items')
+    assert app.test_client().get('/items/block').get_json() == {'inside': ['written'], 'outside': []}
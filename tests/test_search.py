@@ -0,0 +1,135 @@
+import html
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from flask import template_rendered
+
+import search
+from models import db, Venue, Artist, Show
+
+VENUES = [
+    # name, city, state, genres, upcoming shows, past shows
+    ('The Jazz Cellar', 'Austin', 'TX', ['Jazz'], 2, 1),
+    ('Park Hall', 'Austin', 'TX', ['Rock n Roll'], 0, 1),
+    ('Parkside Lounge', 'New York', 'NY', ['Jazz', 'Blues'], 1, 0),
+    ('Blue Note', 'New York', 'NY', ['Jazz'], 0, 0),
+    ('Cafe Folk', 'Seattle', 'WA', ['Folk'], 3, 0),
+]
+ARTISTS = [
+    ('Alto Trio', ['Jazz']),
+    ('Brass Five', ['Jazz', 'Funk']),
+    ('Crate Diggers', ['Hip-Hop']),
+    ('Dusk Quartet', ['Jazz']),
+    ('Echo Folk', ['Folk']),
+]
+
+
+@pytest.fixture
+def listed(app):
+    with app.app_context():
+        artists = [Artist(name=name, city='Austin', state='TX', genres=genres, seeking_venue=False)
+                   for name, genres in ARTISTS]
+        db.session.add_all(artists)
+        now = datetime.now()
+        for name, city, state, genres, upcoming, past in VENUES:
+            venue = Venue(name=name, city=city, state=state, address='1 Main St', genres=genres,
+                          seeking_talent=False)
+            db.session.add(venue)
+            db.session.flush()
+            starts = [now + timedelta(days=i + 1) for i in range(upcoming)] + \
+                [now - timedelta(days=i + 1) for i in range(past)]
+            db.session.add_all([Show(venue_id=venue.id, artist_id=artists[0].id, start_time=start)
+                                for start in starts])
+        db.session.commit()
+    return app
+
+
+@contextmanager
+def rendered(app):
+    """The context of every template rendered inside the block."""
+    contexts = []
+
+    def record(sender, template, context, **extra):
+        contexts.append(context)
+
+    template_rendered.connect(record, app)
+    try:
+        yield contexts
+    finally:
+        template_rendered.disconnect(record, app)
+
+
+def names(results):
+    return [hit.name for hit in results.data]
+
+
+@pytest.mark.parametrize('term', ['park', 'PARK', 'Park', 'Pa', 'pA'])
+def test_names_match_by_prefix_ignoring_case(listed, term):
+    with listed.app_context():
+        assert sorted(names(search.search(Venue, term))) == ['Park Hall', 'Parkside Lounge']
+
+
+def test_area_and_genre_terms(listed):
+    with listed.app_context():
+        assert sorted(names(search.search(Venue, 'new york'))) == ['Blue Note', 'Parkside Lounge']
+        assert sorted(names(search.search(Venue, 'JAZZ'))) == ['Blue Note', 'Parkside Lounge', 'The Jazz Cellar']
+        assert sorted(names(search.search(Artist, 'folk'))) == ['Echo Folk']
+
+
+def test_hits_carry_their_upcoming_show_counts(listed):
+    with listed.app_context():
+        hits = {hit.name: hit for hit in search.search(Venue, 'jazz').data}
+    assert {name: hit.num_upcoming_shows for name, hit in hits.items()} == \
+        {'The Jazz Cellar': 2, 'Parkside Lounge': 1, 'Blue Note': 0}
+    assert (hits['Blue Note'].city, hits['Blue Note'].state) == ('New York', 'NY')
+
+
+def test_venues_are_grouped_by_area(listed, client):
+    with rendered(listed) as contexts:
+        assert client.get('/venues').status_code == 200
+    areas = [(area['city'], area['state'], [(venue['name'], venue['num_upcoming_shows']) for venue in area['venues']])
+             for area in contexts[0]['areas']]
+    assert areas == [('Austin', 'TX', [('Park Hall', 0), ('The Jazz Cellar', 2)]),
+                     ('New York', 'NY', [('Blue Note', 0), ('Parkside Lounge', 1)]),
+                     ('Seattle', 'WA', [('Cafe Folk', 3)])]
+
+
+def test_venue_areas_follow_the_facets(listed, client):
+    with rendered(listed) as contexts:
+        client.get('/venues?genre=Jazz&state=NY')
+    assert [(area['city'], [venue['name'] for venue in area['venues']]) for area in contexts[0]['areas']] == \
+        [('New York', ['Blue Note', 'Parkside Lounge'])]
+
+
+def test_search_pager_keeps_the_facets(listed, client, monkeypatch):
+    monkeypatch.setitem(listed.config, 'SEARCH_PER_PAGE', 1)
+    found = []
+    page = 1
+    while True:
+        with rendered(listed) as contexts:
+            response = client.post('/venues/search', data={'search_term': 'e', 'genre': 'Jazz', 'page': page})
+        results = contexts[0]['results']
+        assert results.count == 3
+        found += names(results)
+        if not results.has_next:
+            break
+        # the Next form posts the filter again
+        assert '<input type="hidden" name="genre" value="Jazz">' in response.get_data(as_text=True)
+        page += 1
+    assert sorted(found) == ['Blue Note', 'Parkside Lounge', 'The Jazz Cellar']
+
+
+def test_artist_pager_keeps_the_facets(listed, client):
+    url = '/artists?genre=Jazz&per_page=1'
+    found = []
+    while url:
+        with rendered(listed) as contexts:
+            response = client.get(url)
+        found += [artist.name for artist in contexts[0]['artists']]
+        link = re.search(r'<li class="next"><a href="([^"]+)"', response.get_data(as_text=True))
+        url = html.unescape(link.group(1)) if link else None
+        if url:
+            assert 'genre=Jazz' in url
+    assert found == ['Alto Trio', 'Brass Five', 'Dusk Quartet']